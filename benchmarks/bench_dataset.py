@@ -0,0 +1,57 @@
+"""Parse time and memory: pandas CSV parsing vs the column cache in src/preprocess.py.
+
+    python benchmarks/bench_dataset.py --scale 100
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import pandas as pd
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src import preprocess
+
+DATA_PATH = "data/crop_yield.csv"
+
+
+def best_of(fn, repeat=5):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scale", type=int, default=1, help="Concatenate the dataset this many times first")
+    args = parser.parse_args()
+
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        path = DATA_PATH
+        if args.scale > 1:
+            path = os.path.join(tmp_dir, "crop_yield.csv")
+            pd.concat([pd.read_csv(DATA_PATH)] * args.scale).to_csv(path, index=False)
+        preprocess.CACHE_DIR = os.path.join(tmp_dir, "cache")
+
+        build_s, _ = best_of(lambda: preprocess.build_column_cache(path), repeat=1)
+        csv_s, csv_df = best_of(lambda: pd.read_csv(path))
+        cache_s, cache_df = best_of(lambda: preprocess.load_dataset(path))
+
+        print(f"rows: {len(csv_df):,}  (cache build, one-off: {build_s * 1e3:.1f} ms)")
+        print(f"{'loader':<14}{'time (ms)':>12}{'memory (KB)':>14}")
+        for name, seconds, df in (("read_csv", csv_s, csv_df), ("column cache", cache_s, cache_df)):
+            memory = df.memory_usage(deep=True).sum() / 1024
+            print(f"{name:<14}{seconds * 1e3:>12.2f}{memory:>14.0f}")
+    finally:
+        shutil.rmtree(tmp_dir)
+
+
+if __name__ == "__main__":
+    main()
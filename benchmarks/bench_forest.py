@@ -0,0 +1,46 @@
+"""Latency of the compiled forest against sklearn's RandomForestClassifier.
+
+Run from the repository root after training:
+
+    python benchmarks/bench_forest.py
+"""
+import os
+import sys
+import time
+
+import joblib
+import numpy as np
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from benchmarks.run import synthetic_rows
+from src.forest import compile_forest
+from src.predict import MODEL_PATH
+
+
+def best_of(fn, X, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(X)
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def main():
+    model = joblib.load(MODEL_PATH)
+    forest = compile_forest(model)
+
+    X = synthetic_rows(10000)
+    identical = np.array_equal(model.predict_proba(X), forest.predict_proba(X))
+    print(f"Bit-identical probabilities on 10k rows: {identical}")
+
+    print(f"{'engine':<10}{'1 row (ms)':>14}{'10k rows (ms)':>16}")
+    for name, fn in (("sklearn", model.predict), ("compiled", forest.predict)):
+        single = best_of(fn, X[:1], repeat=200)
+        batch = best_of(fn, X, repeat=5)
+        print(f"{name:<10}{single * 1e3:>14.3f}{batch * 1e3:>16.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""Leaf image decode + resize: full-resolution path vs src.images.
+
+For synthetic JPEG photos of several sizes it times the old path
+(``cv2.imdecode(buf, 1)`` then a default-interpolation resize) against
+the header-driven reduced decode with area resizing, and traces the peak
+memory each one allocates (OpenCV's Python binding allocates its output
+arrays through NumPy, so tracemalloc sees the decoded image). Latency
+and memory are also given per megapixel, together with the mean
+absolute difference of the 256x256 model inputs. A final case decodes a
+batch serially and on a thread pool.
+
+    python benchmarks/bench_images.py --sizes 1 3 12 --batch 24
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+import tracemalloc
+
+import cv2
+import numpy as np
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.images import decode, load_batch, resize
+from src.leaf import IMAGE_SIZE
+
+
+def synthetic_jpeg(megapixels, seed=0, quality=90):
+    # Smooth shading plus texture, so it compresses like a photo rather than noise
+    height = int(np.sqrt(megapixels * 1e6 * 3 / 4))
+    width = int(height * 4 / 3)
+    rng = np.random.default_rng(seed)
+    yy, xx = np.mgrid[0:height, 0:width].astype(np.float32)
+    base = np.stack([xx / width * 120 + 60, yy / height * 160 + 40, (xx + yy) / (width + height) * 90 + 30], axis=2)
+    noise = cv2.GaussianBlur(rng.normal(0, 25, (height, width, 3)).astype(np.float32), (0, 0), 3)
+    image = np.clip(base + noise, 0, 255).astype(np.uint8)
+    return cv2.imencode(".jpg", image, [cv2.IMWRITE_JPEG_QUALITY, quality])[1].tobytes(), width * height / 1e6
+
+
+def full_path(data):
+    image = cv2.imdecode(np.asarray(bytearray(data), dtype=np.uint8), 1)
+    return cv2.resize(image, (IMAGE_SIZE, IMAGE_SIZE))
+
+
+def reduced_path(data):
+    return resize(decode(data, IMAGE_SIZE), IMAGE_SIZE)
+
+
+def measure(fn, data, repeat):
+    fn(data)
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(data)
+        times.append(time.perf_counter() - start)
+    tracemalloc.start()
+    fn(data)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return statistics.median(times), peak
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare leaf image decode paths.")
+    parser.add_argument("--sizes", type=float, nargs="*", default=[1, 3, 12], help="Image sizes in megapixels")
+    parser.add_argument("--repeat", type=int, default=10, help="Timed runs per case")
+    parser.add_argument("--batch", type=int, default=24, help="Images in the thread-pool case (0 to skip)")
+    args = parser.parse_args(argv)
+
+    print(f"{'MP':>5} {'path':<8}{'ms':>9}{'ms/MP':>9}{'peak MB':>10}{'MB/MP':>8}{'mean |diff|':>13}")
+    for mp in args.sizes:
+        data, actual_mp = synthetic_jpeg(mp)
+        reference = full_path(data).astype(np.int16)
+        for name, fn in (("full", full_path), ("reduced", reduced_path)):
+            seconds, peak = measure(fn, data, args.repeat)
+            diff = np.abs(fn(data).astype(np.int16) - reference).mean()
+            print(f"{actual_mp:>5.1f} {name:<8}{seconds * 1e3:>9.2f}{seconds * 1e3 / actual_mp:>9.2f}"
+                  f"{peak / 2**20:>10.1f}{peak / 2**20 / actual_mp:>8.2f}{diff:>13.2f}")
+
+    if args.batch:
+        data, actual_mp = synthetic_jpeg(max(args.sizes))
+        blobs = [data] * args.batch
+        start = time.perf_counter()
+        np.stack([full_path(blob) for blob in blobs])
+        serial = time.perf_counter() - start
+        start = time.perf_counter()
+        load_batch(blobs, IMAGE_SIZE)
+        pooled = time.perf_counter() - start
+        print(f"\n{args.batch} x {actual_mp:.1f} MP: full serial {serial:.2f}s, "
+              f"reduced on {os.cpu_count()} threads {pooled:.2f}s ({serial / pooled:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""Per-process memory and cold load time: unpickled forest vs memory-mapped export.
+
+Starts several worker processes per mode, each loading the crop model the
+way a Streamlit server would, and reads RSS/PSS from /proc (Linux only)
+while all workers are alive. PSS splits shared pages between the
+processes mapping them, so it shows what each worker really costs.
+
+    python benchmarks/bench_mmap.py --workers 4
+"""
+import argparse
+import multiprocessing as mp
+import os
+import sys
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+SAMPLE = [[90, 42, 43, 20.9, 82.0, 6.5, 202.9]]
+
+
+def _memory_kb():
+    values = {}
+    with open("/proc/self/smaps_rollup") as f:
+        for line in f:
+            parts = line.split()
+            if parts[0] in ("Rss:", "Pss:"):
+                values[parts[0][:-1]] = int(parts[1])
+    return values
+
+
+def _worker(mode, ready, done, results):
+    import joblib
+    import numpy as np
+    import sklearn.ensemble  # noqa: F401  imported up front so only the load is timed
+    from src.forest import FOREST_PATH, load_forest
+    from src.predict import MODEL_PATH
+
+    before = _memory_kb()
+    start = time.perf_counter()
+    if mode == "pickle":
+        model = joblib.load(MODEL_PATH)
+    else:
+        model = load_forest(FOREST_PATH, mmap_mode="r")
+    load_time = time.perf_counter() - start
+    model.predict(np.asarray(SAMPLE))
+
+    ready.wait()
+    after = _memory_kb()
+    results.put({
+        "load_ms": load_time * 1e3,
+        "rss_mb": (after["Rss"] - before["Rss"]) / 1024,
+        "pss_mb": (after["Pss"] - before["Pss"]) / 1024,
+    })
+    done.wait()
+
+
+def run(mode, workers):
+    ctx = mp.get_context("spawn")
+    ready, done = ctx.Barrier(workers), ctx.Barrier(workers + 1)
+    results = ctx.Queue()
+    procs = [ctx.Process(target=_worker, args=(mode, ready, done, results)) for _ in range(workers)]
+    for p in procs:
+        p.start()
+    rows = [results.get() for _ in procs]
+    done.wait()
+    for p in procs:
+        p.join()
+    return {key: sum(r[key] for r in rows) / len(rows) for key in rows[0]}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", type=int, default=4)
+    args = parser.parse_args()
+
+    print(f"{'mode':<8}{'load (ms)':>12}{'RSS/proc (MB)':>16}{'PSS/proc (MB)':>16}")
+    for mode in ("pickle", "mmap"):
+        r = run(mode, args.workers)
+        print(f"{mode:<8}{r['load_ms']:>12.1f}{r['rss_mb']:>16.1f}{r['pss_mb']:>16.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""Leaf page upload ingestion: old copy-and-decode path vs zero-copy ingestion.
+
+For each synthetic phone photo this measures:
+
+- before: ``np.asarray(bytearray(upload.read()))``, a full-resolution
+  decode and resize for the model, and the full decoded image handed to
+  ``st.image``
+- after: ``np.frombuffer`` over the upload buffer, the header limit
+  check, the reduced decode and resize, and a JPEG thumbnail for display
+
+It reports the peak memory tracemalloc sees (NumPy and OpenCV's output
+arrays are traced) and the bytes sent to the browser. The old path's
+payload is the full image encoded as PNG and as JPEG q=95; the new one
+is the thumbnail itself. Echoing the raw upload, as the multi-image
+gallery did, sends the "upload KB" column.
+
+    python benchmarks/bench_upload.py --sizes 3 12
+"""
+import argparse
+import io
+import os
+import sys
+import time
+import tracemalloc
+
+import cv2
+import numpy as np
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from benchmarks.bench_images import synthetic_jpeg
+from src.images import check_limits, decode, encode_jpeg, resize, thumbnail
+from src.leaf import IMAGE_SIZE
+
+
+def before(upload):
+    image = cv2.imdecode(np.asarray(bytearray(upload.read())), 1)
+    batch = cv2.resize(image, (IMAGE_SIZE, IMAGE_SIZE)).reshape((1, IMAGE_SIZE, IMAGE_SIZE, 3))
+    return batch, image
+
+
+def after(upload):
+    data = upload.getbuffer()
+    check_limits(data)
+    batch = resize(decode(data, IMAGE_SIZE), IMAGE_SIZE)[None]
+    return batch, thumbnail(data)
+
+
+def traced(fn, data):
+    upload = io.BytesIO(data)
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = fn(upload)
+    seconds = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return result, seconds, peak
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare leaf upload ingestion paths.")
+    parser.add_argument("--sizes", type=float, nargs="*", default=[3, 12], help="Photo sizes in megapixels")
+    args = parser.parse_args(argv)
+
+    print(f"{'MP':>5} {'upload KB':>10} {'path':<7}{'ms':>8}{'peak MB':>9}{'payload KB':>26}")
+    for mp in args.sizes:
+        data, actual_mp = synthetic_jpeg(mp)
+        traced(before, data)
+        (_, image), seconds, peak = traced(before, data)
+        png = len(cv2.imencode(".png", image)[1])
+        jpeg = len(encode_jpeg(image, 95))
+        print(f"{actual_mp:>5.1f} {len(data) / 1024:>10.0f} {'before':<7}{seconds * 1e3:>8.1f}{peak / 2**20:>9.1f}"
+              f"{f'{png / 1024:.0f} (PNG) / {jpeg / 1024:.0f} (JPEG)':>26}")
+        (_, thumb), seconds, peak = traced(after, data)
+        print(f"{'':>5} {'':>10} {'after':<7}{seconds * 1e3:>8.1f}{peak / 2**20:>9.1f}{len(thumb) / 1024:>26.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""Cold-start import report for the Streamlit pages.
+
+Runs each page once in a fresh interpreter with ``-X importtime`` (the
+Streamlit calls run in bare mode and render nothing), then sums the
+cumulative time of its top-level imports and lists the slowest packages.
+With --compare REV the same pages are also run as they were at that git
+revision, to show the before/after difference.
+
+    python benchmarks/importtime.py --compare HEAD~1
+"""
+import argparse
+import os
+import subprocess
+import sys
+import time
+from collections import defaultdict
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+PAGES_DIR = os.path.join(ROOT, "ui", "pages")
+HEAVY = ("keras", "tensorflow", "cv2", "matplotlib", "fpdf", "sklearn")
+
+
+def parse_importtime(stderr):
+    """Return {top-level package: cumulative microseconds} for root imports."""
+    totals = defaultdict(int)
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        # Nested imports are indented under the module that pulled them in
+        if name.startswith(" ") and not name.startswith("  "):
+            totals[name.strip().split(".")[0]] += int(cumulative)
+    return dict(totals)
+
+
+def run_page(path):
+    env = dict(os.environ, PYTHONDONTWRITEBYTECODE="1")
+    start = time.perf_counter()
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", path],
+        cwd=ROOT, env=env, capture_output=True, text=True,
+    )
+    wall = time.perf_counter() - start
+    if proc.returncode != 0:
+        errors = [line for line in proc.stderr.splitlines() if not line.startswith("import time:")]
+        print(f"  warning: {os.path.basename(path)} exited with {proc.returncode}: {errors[-1] if errors else ''}")
+    return wall, parse_importtime(proc.stderr)
+
+
+def page_at_revision(rev, name):
+    """Write the page as of ``rev`` next to the current one and return its path."""
+    source = subprocess.run(
+        ["git", "show", f"{rev}:ui/pages/{name}"],
+        cwd=ROOT, capture_output=True, text=True, check=True,
+    ).stdout
+    path = os.path.join(PAGES_DIR, f"_importtime_{name}")
+    with open(path, "w") as f:
+        f.write(source)
+    return path
+
+
+def summarize(label, wall, imports, top):
+    total = sum(imports.values()) / 1e6
+    heavy = sorted(pkg for pkg in imports if pkg in HEAVY)
+    slowest = sorted(imports.items(), key=lambda item: item[1], reverse=True)[:top]
+    print(f"  {label:<8} wall {wall:6.2f}s  imports {total:6.2f}s  heavy: {', '.join(heavy) or '-'}")
+    for pkg, us in slowest:
+        print(f"      {pkg:<24}{us / 1e3:>10.1f} ms")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Import-time report per Streamlit page.")
+    parser.add_argument("pages", nargs="*", help="Page file names (default: all pages)")
+    parser.add_argument("--compare", metavar="REV", help="Also run the pages as of this git revision")
+    parser.add_argument("--top", type=int, default=5, help="Slowest packages to list per page")
+    args = parser.parse_args(argv)
+
+    pages = args.pages or sorted(
+        name for name in os.listdir(PAGES_DIR) if name.endswith(".py") and not name.startswith("_")
+    )
+    for name in pages:
+        print(name)
+        if args.compare:
+            old_path = page_at_revision(args.compare, name)
+            try:
+                summarize("before", *run_page(old_path), args.top)
+            finally:
+                os.remove(old_path)
+        summarize("after" if args.compare else "now", *run_page(os.path.join(PAGES_DIR, name)), args.top)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+"""Benchmark suite for the crop prediction path.
+
+Times model load, single-row predict_crop, predict_batch at several batch
+sizes and label decoding on synthetic rows drawn uniformly from the
+per-column ranges in data/crop_yield.csv. Results are written as JSON;
+given a saved baseline, any case whose median is more than --threshold
+slower fails the run.
+
+    python benchmarks/run.py --output bench.json
+    python benchmarks/run.py --baseline bench.json --threshold 0.2
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+
+import joblib
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.predict import FEATURES, MODEL_PATH, ModelRegistry, predict_batch, predict_crop, registry
+
+DATA_PATH = "data/crop_yield.csv"
+BATCH_SIZES = (1, 100, 10000, 1000000)
+
+
+def synthetic_rows(n, seed=0):
+    df = pd.read_csv(DATA_PATH, usecols=FEATURES)
+    rng = np.random.default_rng(seed)
+    lo = df[FEATURES].min().to_numpy()
+    hi = df[FEATURES].max().to_numpy()
+    return rng.uniform(lo, hi, size=(n, len(FEATURES)))
+
+
+def measure(fn, repeat, warmup=1):
+    for _ in range(warmup):
+        fn()
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return {
+        "repeat": repeat,
+        "min_s": min(times),
+        "median_s": statistics.median(times),
+        "mean_s": statistics.fmean(times),
+    }
+
+
+def _repeats(rows):
+    return max(1, min(200, 200000 // max(rows, 1)))
+
+
+def run_suite(batch_sizes=BATCH_SIZES):
+    results = {}
+
+    results["load_pickle"] = measure(lambda: joblib.load(MODEL_PATH), repeat=5)
+    results["load_registry"] = measure(lambda: ModelRegistry().get_compiled(), repeat=10)
+
+    X = synthetic_rows(max(batch_sizes))
+    row = dict(zip(FEATURES, X[0].tolist()))
+    registry.get()
+    results["predict_crop"] = measure(lambda: predict_crop(row), repeat=200)
+
+    for n in batch_sizes:
+        batch = X[:n]
+        # The largest batches take seconds each, so they skip the warmup run
+        case = measure(lambda: predict_batch(batch), repeat=_repeats(n), warmup=int(n <= 10000))
+        case["rows_per_s"] = n / case["median_s"]
+        results[f"predict_batch_{n}"] = case
+
+    _, encoder = registry.get()
+    codes = np.random.default_rng(1).integers(0, len(encoder.classes_), size=10000)
+    results["decode_10000"] = measure(lambda: encoder.inverse_transform(codes), repeat=50)
+    return results
+
+
+def compare(results, baseline, threshold):
+    """Return (case, baseline median, current median) for every regression."""
+    regressions = []
+    for name, case in results.items():
+        if name not in baseline:
+            continue
+        before = baseline[name]["median_s"]
+        after = case["median_s"]
+        if before > 0 and (after - before) / before > threshold:
+            regressions.append((name, before, after))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the crop prediction path.")
+    parser.add_argument("--output", help="Write results JSON here")
+    parser.add_argument("--baseline", help="Results JSON to compare against")
+    parser.add_argument("--threshold", type=float, default=0.2, help="Allowed slowdown of the median (0.2 = 20%%)")
+    parser.add_argument("--max-rows", type=int, default=max(BATCH_SIZES), help="Skip batch sizes above this")
+    args = parser.parse_args(argv)
+
+    batch_sizes = tuple(n for n in BATCH_SIZES if n <= args.max_rows)
+    results = run_suite(batch_sizes)
+
+    for name, case in results.items():
+        extra = f"  {case['rows_per_s']:,.0f} rows/s" if "rows_per_s" in case else ""
+        print(f"{name:<24}{case['median_s'] * 1e3:>12.3f} ms{extra}")
+
+    if args.output:
+        report = {
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "results": results,
+        }
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)["results"]
+        regressions = compare(results, baseline, args.threshold)
+        for name, before, after in regressions:
+            print(f"REGRESSION {name}: {before * 1e3:.3f} ms -> {after * 1e3:.3f} ms", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
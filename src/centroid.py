@@ -0,0 +1,174 @@
+"""Nearest-centroid fast path for crop prediction; rows it is unsure of go to the forest.
+
+    python -m src.centroid    # parity of the saved cascade on the holdout split
+"""
+
+import joblib
+import numpy as np
+import pandas as pd
+
+from src.forest import load_forest
+from src.schema import FEATURES
+
+CENTROIDS_PATH = "models/crop_centroids.pkl"
+
+# Squared distance beyond which a row is far from every crop (chi-square, 7 dof, p = 0.999)
+MAX_DISTANCE = 24.32
+# Share of accepted training rows allowed to disagree with the forest
+PARITY_TOLERANCE = 0.001
+# Rows per block, keeps the (rows, classes, features) intermediate small
+BLOCK_ROWS = 4096
+
+
+class CentroidModel:
+    """Per-class means and Cholesky factors of the precision matrices, for vectorized Mahalanobis distances."""
+
+    def __init__(self, means, whiten, classes, margin, max_distance=MAX_DISTANCE):
+        self.means = means
+        self.whiten = whiten
+        self.classes_ = classes
+        self.margin = float(margin)
+        self.max_distance = float(max_distance)
+
+    def to_arrays(self):
+        return {
+            "means": self.means,
+            "whiten": self.whiten,
+            "classes": self.classes_,
+            "margin": self.margin,
+            "max_distance": self.max_distance,
+        }
+
+    @classmethod
+    def from_arrays(cls, arrays):
+        return cls(**arrays)
+
+    def distances(self, X):
+        """Squared Mahalanobis distance of every row to every class, shape (n, n_classes)."""
+        X = np.asarray(X, dtype=np.float64)
+        if X.ndim == 1:
+            X = X.reshape(1, -1)
+        # mean[c] @ whiten[c], so each block needs a single einsum
+        offsets = np.einsum("cj,cjk->ck", self.means, self.whiten)
+        out = np.empty((len(X), len(self.means)), dtype=np.float64)
+        for start in range(0, len(X), BLOCK_ROWS):
+            z = np.einsum("nj,cjk->nck", X[start:start + BLOCK_ROWS], self.whiten) - offsets
+            out[start:start + BLOCK_ROWS] = np.einsum("nck,nck->nc", z, z)
+        return out
+
+    def scores(self, X, d=None):
+        """Best class index, its distance and the margin to the runner-up per row."""
+        d = self.distances(X) if d is None else d
+        two = np.partition(d, 1, axis=1)[:, :2]
+        return np.argmin(d, axis=1), two[:, 0], two[:, 1] - two[:, 0]
+
+    def _accepted(self, nearest, margin):
+        return (nearest <= self.max_distance) & (margin >= self.margin)
+
+    def predict(self, X):
+        """Return (labels, accepted); labels are only meaningful where accepted is True."""
+        best, nearest, margin = self.scores(X)
+        return self.classes_.take(best), self._accepted(nearest, margin)
+
+    def predict_proba(self, X):
+        """Return (probabilities, accepted); each row is a softmax of -distance / 2 over the classes."""
+        d = self.distances(X)
+        _, nearest, margin = self.scores(X, d)
+        proba = np.exp(-(d - nearest[:, None]) / 2)
+        proba /= proba.sum(axis=1, keepdims=True)
+        return proba, self._accepted(nearest, margin)
+
+
+def _calibrate_margin(margin, nearest, agrees, tolerance, max_distance):
+    # Smallest margin at which the accepted rows still agree with the forest
+    candidates = nearest <= max_distance
+    margin, agrees = margin[candidates], agrees[candidates]
+    order = np.argsort(-margin, kind="stable")
+    errors = np.cumsum(~agrees[order])
+    ok = np.nonzero(errors <= tolerance * np.arange(1, len(order) + 1))[0]
+    if len(ok) == 0:
+        return np.inf
+    return float(margin[order[ok[-1]]])
+
+
+def oob_labels(model, X, trees=None):
+    """Forest labels for the training rows X, each voted only by the trees (of ``trees``) that did not sample it."""
+    X = np.asarray(X, dtype=np.float32)
+    trees = range(len(model.estimators_)) if trees is None else trees
+    samples = model.estimators_samples_
+    votes = np.zeros((len(X), len(model.classes_)))
+    for t in trees:
+        oob = np.ones(len(X), dtype=bool)
+        oob[samples[t]] = False
+        if oob.any():
+            votes[oob] += model.estimators_[t].predict_proba(X[oob])
+    labels = model.classes_.take(np.argmax(votes, axis=1))
+    unvoted = votes.sum(axis=1) == 0
+    if unvoted.any():
+        labels[unvoted] = model.predict(pd.DataFrame(X[unvoted], columns=FEATURES))
+    return labels
+
+
+def fit_centroids(X, y, forest_labels, tolerance=PARITY_TOLERANCE, max_distance=MAX_DISTANCE):
+    """Fit class means/covariances on (X, y) and calibrate the margin against held-out or OOB forest_labels."""
+    X = np.asarray(X, dtype=np.float64)
+    y = np.asarray(y)
+    classes = np.unique(y)
+    n_features = X.shape[1]
+
+    means = np.empty((len(classes), n_features))
+    whiten = np.empty((len(classes), n_features, n_features))
+    for i, c in enumerate(classes):
+        rows = X[y == c]
+        means[i] = rows.mean(axis=0)
+        cov = np.cov(rows, rowvar=False) if len(rows) > 1 else np.zeros((n_features, n_features))
+        # A small ridge keeps near-constant columns from making the precision singular
+        cov += np.eye(n_features) * (1e-3 * np.trace(cov) / n_features + 1e-9)
+        whiten[i] = np.linalg.cholesky(np.linalg.inv(cov))
+
+    model = CentroidModel(means, whiten, classes, margin=np.inf, max_distance=max_distance)
+    best, nearest, margin = model.scores(X)
+    agrees = classes.take(best) == np.asarray(forest_labels)
+    model.margin = _calibrate_margin(margin, nearest, agrees, tolerance, max_distance)
+    return model
+
+
+def parity_report(centroids, forest, X, y=None):
+    """Compare the cascade with the forest alone on X (and with the true labels y if given)."""
+    X = np.asarray(X, dtype=np.float64)
+    labels, accepted = centroids.predict(X)
+    forest_labels = forest.predict(X)
+    cascade = np.where(accepted, labels, forest_labels)
+
+    report = {
+        "rows": len(X),
+        "fast_path_rate": float(np.mean(accepted)) if len(X) else 0.0,
+        "agreement": float(np.mean(cascade == forest_labels)) if len(X) else 1.0,
+    }
+    if y is not None:
+        report["forest_accuracy"] = float(np.mean(forest_labels == y))
+        report["cascade_accuracy"] = float(np.mean(cascade == y))
+    return report
+
+
+def save_centroids(centroids, path=CENTROIDS_PATH):
+    joblib.dump(centroids.to_arrays(), path)
+
+
+def load_centroids(path=CENTROIDS_PATH):
+    return CentroidModel.from_arrays(joblib.load(path))
+
+
+def main():
+    # train.py imports this module, so its helpers are imported here
+    from src.train import load_training_data, split_data
+
+    X, y, _ = load_training_data()
+    _, X_test, _, y_test = split_data(X, y)
+    report = parity_report(load_centroids(), load_forest(), X_test.to_numpy(), y_test)
+    for name, value in report.items():
+        print(f"{name:<18}{value}")
+
+
+if __name__ == "__main__":
+    main()
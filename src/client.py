@@ -0,0 +1,100 @@
+"""Thin client for the local inference server in src/server.py.
+
+``get_client()`` returns a client when ``AGRI_INFERENCE_ADDR`` is set
+(``unix:/path/to.sock`` or ``host:port``) and ``None`` otherwise, so
+callers fall back to in-process inference.
+"""
+import base64
+import json
+import os
+import socket
+import threading
+
+import numpy as np
+
+ADDRESS_ENV = "AGRI_INFERENCE_ADDR"
+
+
+def encode_array(array):
+    array = np.ascontiguousarray(array)
+    return {
+        "dtype": array.dtype.str,
+        "shape": list(array.shape),
+        "data": base64.b64encode(array.tobytes()).decode("ascii"),
+    }
+
+
+def decode_array(payload):
+    data = base64.b64decode(payload["data"])
+    return np.frombuffer(data, dtype=np.dtype(payload["dtype"])).reshape(payload["shape"])
+
+
+class InferenceClient:
+    """One blocking connection per thread, so concurrent sessions reach the
+    server as concurrent requests it can batch together."""
+
+    def __init__(self, address, timeout=30.0):
+        self.address = address
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _connect(self):
+        if self.address.startswith("unix:"):
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.settimeout(self.timeout)
+            sock.connect(self.address[len("unix:"):])
+        else:
+            host, port = self.address.rsplit(":", 1)
+            sock = socket.create_connection((host, int(port)), timeout=self.timeout)
+        return sock, sock.makefile("rb")
+
+    def request(self, payload):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = self._connect()
+        sock, reader = conn
+        try:
+            sock.sendall(json.dumps(payload).encode() + b"\n")
+            line = reader.readline()
+        except OSError:
+            self.close()
+            raise
+        if not line:
+            self.close()
+            raise ConnectionError(f"Inference server at {self.address} closed the connection")
+
+        response = json.loads(line)
+        if not response.get("ok"):
+            raise RuntimeError(response.get("error", "inference server error"))
+        return response
+
+    def close(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            self._local.conn = None
+            conn[1].close()
+            conn[0].close()
+
+    def crop_proba(self, X):
+        """Return (probabilities, class labels) like the in-process path."""
+        rows = np.asarray(X, dtype=np.float64)
+        response = self.request({"op": "crop", "rows": encode_array(rows)})
+        return decode_array(response["result"]), np.asarray(response["labels"], dtype=object)
+
+    def leaf_proba(self, images):
+        rows = np.asarray(images, dtype=np.uint8)
+        return decode_array(self.request({"op": "leaf", "rows": encode_array(rows)})["result"])
+
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def get_client():
+    address = os.environ.get(ADDRESS_ENV)
+    if not address:
+        return None
+    with _clients_lock:
+        if address not in _clients:
+            _clients[address] = InferenceClient(address)
+        return _clients[address]
@@ -0,0 +1,120 @@
+"""Build smaller crop-model variants and compare their exported size, load time, latency and accuracy.
+
+    python -m src.compact --report models/variants/report.md
+    python -m src.compact --deploy trees50_depth12
+"""
+import argparse
+import os
+import time
+
+import joblib
+import numpy as np
+from sklearn.ensemble import RandomForestClassifier
+
+from src.centroid import fit_centroids, oob_labels
+from src.forest import compile_forest, load_forest, save_forest
+from src.predict import SKLEARN_MIN_ROWS
+from src.train import DATA_PATH, load_training_data, save_artifacts, split_data
+
+VARIANTS_DIR = "models/variants"
+
+VARIANTS = {
+    "baseline": {"n_estimators": 200},
+    "trees100": {"n_estimators": 100},
+    "trees50": {"n_estimators": 50},
+    "trees50_depth12": {"n_estimators": 50, "max_depth": 12},
+    "trees50_leaf3": {"n_estimators": 50, "min_samples_leaf": 3},
+    "trees25_depth10_leaf2": {"n_estimators": 25, "max_depth": 10, "min_samples_leaf": 2},
+    "trees10_depth8": {"n_estimators": 10, "max_depth": 8},
+}
+
+
+def _best_time(fn, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def evaluate_variant(name, params, X_train, X_test, y_train, y_test, batch):
+    model = RandomForestClassifier(random_state=42, **params)
+    model.fit(X_train, y_train)
+
+    # Written the way save_artifacts() writes the production model
+    os.makedirs(VARIANTS_DIR, exist_ok=True)
+    model_path = os.path.join(VARIANTS_DIR, f"{name}_sklearn.pkl")
+    forest_path = os.path.join(VARIANTS_DIR, f"{name}_forest.pkl")
+    joblib.dump(model, model_path)
+    save_forest(compile_forest(model), forest_path)
+
+    load_s = _best_time(lambda: load_forest(forest_path, mmap_mode="r"), repeat=5)
+    forest = load_forest(forest_path, mmap_mode="r")
+    X_test = np.asarray(X_test, dtype=np.float64)
+    single = X_test[:1]
+    batch_predict = model.predict if len(batch) >= SKLEARN_MIN_ROWS else forest.predict
+
+    return {
+        "variant": name,
+        "trees": model.n_estimators,
+        "nodes": len(forest.feature),
+        "sklearn_kb": os.path.getsize(model_path) / 1024,
+        "forest_kb": os.path.getsize(forest_path) / 1024,
+        "load_ms": load_s * 1e3,
+        "single_ms": _best_time(lambda: forest.predict(single), repeat=100) * 1e3,
+        "batch_ms": _best_time(lambda: batch_predict(batch), repeat=3) * 1e3,
+        "accuracy": float(np.mean(model.predict(X_test) == y_test)),
+    }
+
+
+def format_table(rows, batch_rows):
+    header = (
+        f"| variant | trees | nodes | sklearn KB | forest export KB | load ms | 1-row ms "
+        f"| {batch_rows}-row ms | accuracy |"
+    )
+    lines = [header, "|" + "---|" * 9]
+    for r in rows:
+        lines.append(
+            f"| {r['variant']} | {r['trees']} | {r['nodes']} | {r['sklearn_kb']:.0f} | {r['forest_kb']:.0f} "
+            f"| {r['load_ms']:.2f} | {r['single_ms']:.3f} | {r['batch_ms']:.1f} | {r['accuracy']:.4f} |"
+        )
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare compacted crop model variants.")
+    parser.add_argument("--variants", nargs="*", default=list(VARIANTS), help="Variant names to build")
+    parser.add_argument("--batch-rows", type=int, default=10000, help="Rows in the batch latency test")
+    parser.add_argument("--report", help="Also write the Markdown table to this file")
+    parser.add_argument("--deploy", help="Refit this variant and save it as the production model")
+    args = parser.parse_args(argv)
+
+    X, y, encoder = load_training_data()
+    X_train, X_test, y_train, y_test = split_data(X, y)
+
+    if args.deploy:
+        model = RandomForestClassifier(random_state=42, **VARIANTS[args.deploy])
+        model.fit(X_train, y_train)
+        centroids = fit_centroids(X_train, y_train, oob_labels(model, X_train))
+        save_artifacts(model, encoder, centroids, variant=args.deploy, data_path=DATA_PATH, rows=len(X))
+        print(f"Deployed variant {args.deploy}.")
+        return
+
+    rng = np.random.default_rng(0)
+    lo, hi = X_train.min().to_numpy(), X_train.max().to_numpy()
+    batch = rng.uniform(lo, hi, size=(args.batch_rows, len(lo)))
+
+    rows = [
+        evaluate_variant(name, VARIANTS[name], X_train, X_test, y_train, y_test, batch)
+        for name in args.variants
+    ]
+    table = format_table(rows, args.batch_rows)
+    print(table)
+    if args.report:
+        with open(args.report, "w") as f:
+            f.write(table + "\n")
+
+
+if __name__ == "__main__":
+    main()
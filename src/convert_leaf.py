@@ -0,0 +1,160 @@
+"""Export the Keras leaf model to TFLite (optionally int8-calibrated) and compare the backends.
+
+    python -m src.convert_leaf --int8 --calibration data/leaf_samples --report models/leaf_backends.md
+"""
+import argparse
+import json
+import os
+import resource
+import statistics
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+from src.diagnose_batch import list_images
+from src.leaf import MODEL_PATH, TFLITE_PATHS, available_backends, load_disease_model, prepare_batch
+
+
+def load_images(source, limit=None):
+    names, read = list_images(source)
+    names = names[:limit or None]
+    batch, images = prepare_batch([read(name) for name in names])
+    return batch, [name for name, image in zip(names, images) if image is not None]
+
+
+def convert(backend, calibration=None):
+    """Write the TFLite export for ``backend`` ("tflite" or "tflite-int8") and return its path."""
+    import tensorflow as tf
+
+    converter = tf.lite.TFLiteConverter.from_keras_model(load_disease_model("keras"))
+    if backend == "tflite-int8":
+        if calibration is None or len(calibration) == 0:
+            raise ValueError("int8 quantization needs calibration images (--calibration DIR)")
+
+        def representative_dataset():
+            # One image per step, as float32 like the Keras model's input
+            for image in calibration:
+                yield [image[None].astype(np.float32)]
+
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+        converter.representative_dataset = representative_dataset
+        converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+
+    path = TFLITE_PATHS[backend]
+    with open(path + ".tmp", "wb") as f:
+        f.write(converter.convert())
+    os.replace(path + ".tmp", path)
+    return path
+
+
+def _max_rss_mb():
+    # ru_maxrss is in KiB on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def measure_backend(backend, batch, repeat=20):
+    """Load and time one backend in this process; returns timings, memory and top-1 per image."""
+    rss_before = _max_rss_mb()
+    start = time.perf_counter()
+    model = load_disease_model(backend)
+    load_s = time.perf_counter() - start
+
+    model.predict(batch[:1], verbose=0)
+    single = []
+    for i in range(repeat):
+        image = batch[i % len(batch)][None]
+        start = time.perf_counter()
+        model.predict(image, verbose=0)
+        single.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    proba = np.asarray(model.predict(batch, verbose=0))
+    batch_s = time.perf_counter() - start
+
+    path = MODEL_PATH if backend == "keras" else TFLITE_PATHS[backend]
+    return {
+        "backend": backend,
+        "file_mb": os.path.getsize(path) / 2**20,
+        "load_s": load_s,
+        "rss_mb": _max_rss_mb() - rss_before,
+        "single_ms": statistics.median(single) * 1e3,
+        "batch_ms_per_image": batch_s * 1e3 / len(batch),
+        "top1": np.argmax(proba, axis=1).tolist(),
+    }
+
+
+def _measure_in_subprocess(backend, images_dir, limit):
+    proc = subprocess.run(
+        [sys.executable, "-m", "src.convert_leaf", "--measure", backend, "--images", images_dir, "--limit", str(limit)],
+        capture_output=True, text=True, check=True,
+    )
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def compare_backends(backends, images_dir, limit):
+    results = [_measure_in_subprocess(backend, images_dir, limit) for backend in backends]
+    reference = np.array(next(r["top1"] for r in results if r["backend"] == "keras"))
+    for r in results:
+        r["top1_agreement"] = float(np.mean(np.array(r.pop("top1")) == reference))
+    return results
+
+
+def format_table(results, n_images):
+    lines = [
+        f"Top-1 agreement is against Keras on {n_images} images.",
+        "",
+        "| backend | file MB | load s | peak RSS MB | 1-image ms | batch ms/image | top-1 agreement |",
+        "|" + "---|" * 7,
+    ]
+    for r in results:
+        lines.append(
+            f"| {r['backend']} | {r['file_mb']:.1f} | {r['load_s']:.2f} | {r['rss_mb']:.0f} | {r['single_ms']:.2f} "
+            f"| {r['batch_ms_per_image']:.2f} | {r['top1_agreement']:.4f} |"
+        )
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export the leaf model to TFLite and compare backends.")
+    parser.add_argument("--int8", action="store_true", help="Also write an int8-quantized export")
+    parser.add_argument("--calibration", metavar="DIR", help="Leaf photos used to calibrate --int8")
+    parser.add_argument("--samples", type=int, default=200, help="Calibration images used at most")
+    parser.add_argument("--report", help="Compare the backends and write the Markdown table here")
+    parser.add_argument("--images", metavar="DIR", help="Images for --report (default: the calibration set)")
+    parser.add_argument("--limit", type=int, default=200, help="Report images used at most")
+    parser.add_argument("--no-convert", action="store_true", help="Only run the report on existing exports")
+    parser.add_argument("--measure", choices=list(TFLITE_PATHS) + ["keras"], help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.measure:
+        # Child process of compare_backends(): one backend, JSON on stdout
+        batch, _ = load_images(args.images, args.limit)
+        print(json.dumps(measure_backend(args.measure, batch)))
+        return
+
+    backends = ["tflite"] + (["tflite-int8"] if args.int8 else [])
+    if not args.no_convert:
+        calibration = None
+        if args.int8:
+            if not args.calibration:
+                parser.error("--int8 needs --calibration DIR")
+            calibration, _ = load_images(args.calibration, args.samples)
+        for backend in backends:
+            path = convert(backend, calibration)
+            print(f"Wrote {path} ({os.path.getsize(path) / 2**20:.1f} MB)")
+
+    if args.report:
+        images_dir = args.images or args.calibration
+        if not images_dir:
+            parser.error("--report needs --images DIR or --calibration DIR")
+        n_images = len(list_images(images_dir)[0][:args.limit or None])
+        table = format_table(compare_backends(available_backends(), images_dir, args.limit), n_images)
+        print(table)
+        with open(args.report, "w") as f:
+            f.write(table + "\n")
+
+
+if __name__ == "__main__":
+    main()
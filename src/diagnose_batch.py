@@ -0,0 +1,208 @@
+"""Diagnose a folder or zip of leaf photos to CSV or JSONL; re-running resumes and retries failed images.
+
+    python -m src.diagnose_batch /media/sdcard/DCIM field_visit.csv
+    python -m src.diagnose_batch photos.zip field_visit.jsonl --batch-size 64
+"""
+import argparse
+import csv
+import json
+import os
+import queue
+import sys
+import threading
+import time
+import zipfile
+
+import numpy as np
+
+from src.images import ImageTooLarge, check_limits
+from src.leaf import BACKENDS, CLASS_NAMES, DEFAULT_BACKEND, load_disease_model, predict_leaf, prepare_batch
+
+IMAGE_TYPES = (".jpg", ".jpeg", ".png")
+COLUMNS = ["image", "plant", "disease", "confidence", "error"]
+
+
+def list_images(source):
+    """Return (sorted image names, read(name) -> bytes) for a directory or zip file."""
+    if zipfile.is_zipfile(source):
+        archive = zipfile.ZipFile(source)
+        names = sorted(n for n in archive.namelist() if n.lower().endswith(IMAGE_TYPES))
+        return names, archive.read
+
+    names = sorted(
+        os.path.relpath(os.path.join(root, name), source)
+        for root, _, files in os.walk(source)
+        for name in files
+        if name.lower().endswith(IMAGE_TYPES)
+    )
+
+    def read(name):
+        with open(os.path.join(source, name), "rb") as f:
+            return f.read()
+    return names, read
+
+
+def completed_images(output):
+    """Names already diagnosed in ``output``, after dropping a half-written last line and error rows."""
+    if not os.path.exists(output):
+        return set()
+    with open(output, "rb+") as f:
+        data = f.read()
+        end = data.rfind(b"\n") + 1
+        if end < len(data):
+            f.truncate(end)
+    lines = data[:end].decode("utf-8").splitlines(keepends=True)
+    if output.endswith(".jsonl"):
+        lines = [line for line in lines if line.strip()]
+        try:
+            rows = [json.loads(line) for line in lines]
+        except ValueError:
+            rows = [None]
+        if any(not isinstance(row, dict) or "image" not in row for row in rows):
+            raise ValueError(f"{output} is not a diagnosis results file; choose another output")
+        kept = [line for line, row in zip(lines, rows) if not row["error"]]
+    else:
+        reader = csv.DictReader(lines)
+        if lines and reader.fieldnames != COLUMNS:
+            raise ValueError(f"{output} has columns {reader.fieldnames}, expected {COLUMNS}; "
+                             "choose another output")
+        rows = list(reader)
+        kept = lines[:1] + [line for line, row in zip(lines[1:], rows) if not row["error"]]
+
+    if len(kept) < len(lines):
+        # Replaced in one rename, so an interrupted rewrite loses nothing
+        with open(output + ".tmp", "w", newline="") as f:
+            f.writelines(kept)
+        os.replace(output + ".tmp", output)
+    return {row["image"] for row in rows if not row["error"]}
+
+
+def _put(batches, item, stop):
+    # Blocks while the queue is full, but gives up once the consumer has stopped
+    while not stop.is_set():
+        try:
+            batches.put(item, timeout=0.1)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+
+def _read_all(names, read):
+    """Bytes of each file (b"" when it cannot be used) and its read or size error, or None."""
+    blobs, errors = [], []
+    for name in names:
+        try:
+            data = read(name)
+            check_limits(data)
+            blobs.append(data)
+            errors.append(None)
+        except (OSError, zipfile.BadZipFile) as e:
+            blobs.append(b"")
+            errors.append(f"read error: {e}")
+        except ImageTooLarge as e:
+            blobs.append(b"")
+            errors.append(f"too large: {e}")
+    return blobs, errors
+
+
+def _produce(names, read, batch_size, batches, stop):
+    try:
+        for start in range(0, len(names), batch_size):
+            chunk = names[start:start + batch_size]
+            blobs, errors = _read_all(chunk, read)
+            batch, images = prepare_batch(blobs)
+            errors = [error or ("unreadable image" if image is None else None)
+                      for error, image in zip(errors, images)]
+            if not _put(batches, (chunk, batch, errors), stop):
+                return
+    except Exception as e:
+        _put(batches, e, stop)
+        return
+    _put(batches, None, stop)
+
+
+def result_rows(names, proba, errors):
+    scores = iter(proba)
+    for name, error in zip(names, errors):
+        if error:
+            yield {"image": name, "plant": "", "disease": "", "confidence": "", "error": error}
+            continue
+        p = next(scores)
+        crop, disease = CLASS_NAMES[int(np.argmax(p))].split("-")
+        yield {"image": name, "plant": crop, "disease": disease, "confidence": round(float(np.max(p)), 6), "error": ""}
+
+
+def diagnose_folder(source, output, batch_size=32, prefetch=2, backend=None, restart=False):
+    """Diagnose every image under ``source`` into ``output``; returns (images done, seconds)."""
+    names, read = list_images(source)
+    if restart and os.path.exists(output):
+        os.remove(output)
+    done = completed_images(output)
+    todo = [name for name in names if name not in done]
+    if done:
+        print(f"Resuming: {len(done)} of {len(names)} images already in {output}", file=sys.stderr)
+    if not todo:
+        return 0, 0.0
+
+    load_disease_model(backend)
+    jsonl = output.endswith(".jsonl")
+    new_file = not os.path.exists(output) or os.path.getsize(output) == 0
+
+    batches = queue.Queue(maxsize=prefetch)
+    stop = threading.Event()
+    producer = threading.Thread(target=_produce, args=(todo, read, batch_size, batches, stop), daemon=True)
+    producer.start()
+
+    processed = 0
+    start = time.perf_counter()
+    try:
+        with open(output, "a", newline="") as f:
+            writer = None if jsonl else csv.DictWriter(f, fieldnames=COLUMNS)
+            if writer is not None and new_file:
+                writer.writeheader()
+            while True:
+                item = batches.get()
+                if item is None:
+                    break
+                if isinstance(item, Exception):
+                    raise item
+                chunk, batch, errors = item
+                proba = predict_leaf(batch, backend) if len(batch) else ()
+                for row in result_rows(chunk, proba, errors):
+                    if jsonl:
+                        f.write(json.dumps(row) + "\n")
+                    else:
+                        writer.writerow(row)
+                f.flush()
+
+                processed += len(chunk)
+                elapsed = time.perf_counter() - start
+                print(f"\r{len(done) + processed}/{len(names)} images, {processed / elapsed:.1f} images/sec",
+                      end="", file=sys.stderr)
+    finally:
+        stop.set()
+        producer.join()
+        print(file=sys.stderr)
+    return processed, time.perf_counter() - start
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Diagnose a folder or zip of leaf photos.")
+    parser.add_argument("source", help="Directory (searched recursively) or .zip of .jpg/.png images")
+    parser.add_argument("output", help="Results file, .csv or .jsonl")
+    parser.add_argument("--batch-size", type=int, default=32, help="Images per model call")
+    parser.add_argument("--prefetch", type=int, default=2, help="Decoded batches queued ahead of the model")
+    parser.add_argument("--backend", default=DEFAULT_BACKEND, choices=BACKENDS, help="Leaf model backend")
+    parser.add_argument("--restart", action="store_true", help="Overwrite the output instead of resuming")
+    args = parser.parse_args(argv)
+
+    processed, elapsed = diagnose_folder(
+        args.source, args.output, args.batch_size, args.prefetch, args.backend, args.restart,
+    )
+    rate = processed / elapsed if elapsed > 0 else 0.0
+    print(f"Diagnosed {processed} images in {elapsed:.1f}s ({rate:.1f} images/sec)", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
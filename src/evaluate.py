@@ -0,0 +1,187 @@
+"""Cross-validated evaluation of the crop model, one process per fold, written as JSON and Markdown next to the model.
+
+    python -m src.evaluate --folds 5 --jobs 4
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from sklearn.ensemble import RandomForestClassifier
+
+from src.forest import compile_forest
+from src.schema import MATRIX_DTYPE
+from src.train import (
+    DATA_PATH, MODEL_PARAMS, init_worker, load_manifest, load_training_data, make_folds, worker_data,
+)
+
+REPORT_JSON = "models/evaluation.json"
+REPORT_MD = "models/evaluation.md"
+
+
+def _run_fold(fold, train_idx, test_idx, params):
+    X, y = worker_data["X"], worker_data["y"]
+    X_train, X_test = X[train_idx], X[test_idx]
+
+    start = time.perf_counter()
+    model = RandomForestClassifier(**dict(params, n_jobs=1))
+    model.fit(X_train, y[train_idx])
+    fit_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    predicted = model.predict(X_test)
+    predict_s = time.perf_counter() - start
+
+    forest = compile_forest(model)
+    start = time.perf_counter()
+    forest.predict(X_test)
+    compiled_s = time.perf_counter() - start
+
+    timing = {
+        "fold": fold,
+        "train_rows": len(train_idx),
+        "test_rows": len(test_idx),
+        "accuracy": float(np.mean(predicted == y[test_idx])),
+        "fit_s": fit_s,
+        "fit_rows_per_s": len(train_idx) / fit_s,
+        "predict_s": predict_s,
+        "predict_rows_per_s": len(test_idx) / predict_s,
+        "compiled_predict_rows_per_s": len(test_idx) / compiled_s,
+    }
+    return timing, test_idx, predicted
+
+
+def confusion_matrix(y_true, y_pred, n_classes):
+    """Rows are true classes, columns predicted, from a single bincount."""
+    return np.bincount(y_true * n_classes + y_pred, minlength=n_classes * n_classes).reshape(n_classes, n_classes)
+
+
+def per_class_metrics(confusion):
+    """Precision, recall, F1 and support for every class of a confusion matrix."""
+    tp = np.diag(confusion).astype(np.float64)
+    predicted = confusion.sum(axis=0)
+    support = confusion.sum(axis=1)
+    # Classes never predicted (or absent) score 0 rather than NaN
+    precision = np.divide(tp, predicted, out=np.zeros_like(tp), where=predicted > 0)
+    recall = np.divide(tp, support, out=np.zeros_like(tp), where=support > 0)
+    total = precision + recall
+    f1 = np.divide(2 * precision * recall, total, out=np.zeros_like(tp), where=total > 0)
+    return precision, recall, f1, support
+
+
+def evaluate(n_splits=5, n_jobs=None, params=None):
+    X, y, encoder = load_training_data()
+    if params is None:
+        # Evaluate what is deployed, else the default training configuration
+        manifest = load_manifest()
+        params = manifest["params"] if manifest and manifest.get("params") else MODEL_PARAMS
+    folds = make_folds(y, n_splits)
+    n_jobs = n_jobs or min(n_splits, os.cpu_count())
+    n_classes = len(encoder.classes_)
+
+    predicted = np.empty_like(y)
+    timings = []
+    start = time.perf_counter()
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        X_path = os.path.join(tmp_dir, "X.npy")
+        np.save(X_path, np.ascontiguousarray(X.to_numpy(dtype=MATRIX_DTYPE)))
+        with ProcessPoolExecutor(max_workers=n_jobs, initializer=init_worker,
+                                 initargs=(X_path, y, folds)) as pool:
+            futures = [
+                pool.submit(_run_fold, i, train_idx, test_idx, params)
+                for i, (train_idx, test_idx) in enumerate(folds)
+            ]
+            for future in futures:
+                timing, test_idx, fold_predicted = future.result()
+                predicted[test_idx] = fold_predicted
+                timings.append(timing)
+    wall = time.perf_counter() - start
+
+    confusion = confusion_matrix(y, predicted, n_classes)
+    precision, recall, f1, support = per_class_metrics(confusion)
+    accuracies = np.array([t["accuracy"] for t in timings])
+    return {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "data_path": DATA_PATH,
+        "rows": len(y),
+        "folds": n_splits,
+        "jobs": n_jobs,
+        "wall_s": wall,
+        "params": params,
+        "accuracy": float(np.mean(predicted == y)),
+        "fold_accuracy_mean": float(accuracies.mean()),
+        "fold_accuracy_std": float(accuracies.std()),
+        "macro_f1": float(f1.mean()),
+        "per_fold": timings,
+        "per_class": [
+            {"crop": str(crop), "precision": float(p), "recall": float(r), "f1": float(f), "support": int(s)}
+            for crop, p, r, f, s in zip(encoder.classes_, precision, recall, f1, support)
+        ],
+        "classes": [str(c) for c in encoder.classes_],
+        "confusion": confusion.tolist(),
+    }
+
+
+def format_report(report, top_confusions=10):
+    lines = [
+        "# Crop model evaluation",
+        "",
+        f"{report['folds']}-fold stratified CV on {report['rows']} rows of {report['data_path']} "
+        f"({report['jobs']} processes, {report['wall_s']:.1f}s).",
+        "",
+        f"- Accuracy: {report['accuracy']:.4f} "
+        f"(per fold {report['fold_accuracy_mean']:.4f} +/- {report['fold_accuracy_std']:.4f})",
+        f"- Macro F1: {report['macro_f1']:.4f}",
+        "",
+        "## Folds",
+        "",
+        "| fold | train rows | test rows | accuracy | fit s | fit rows/s | predict rows/s | compiled rows/s |",
+        "|" + "---|" * 8,
+    ]
+    for t in report["per_fold"]:
+        lines.append(
+            f"| {t['fold']} | {t['train_rows']} | {t['test_rows']} | {t['accuracy']:.4f} | {t['fit_s']:.2f} "
+            f"| {t['fit_rows_per_s']:,.0f} | {t['predict_rows_per_s']:,.0f} | {t['compiled_predict_rows_per_s']:,.0f} |"
+        )
+
+    lines += ["", "## Per crop", "", "| crop | precision | recall | F1 | support |", "|" + "---|" * 5]
+    for c in report["per_class"]:
+        lines.append(f"| {c['crop']} | {c['precision']:.4f} | {c['recall']:.4f} | {c['f1']:.4f} | {c['support']} |")
+
+    confusion = np.array(report["confusion"])
+    off = confusion.copy()
+    np.fill_diagonal(off, 0)
+    order = np.argsort(-off, axis=None, kind="stable")[:top_confusions]
+    pairs = [(i, j, off[i, j]) for i, j in zip(*np.unravel_index(order, off.shape)) if off[i, j] > 0]
+    lines += ["", "## Most frequent confusions", ""]
+    if pairs:
+        lines += ["| true | predicted | rows |", "|---|---|---|"]
+        lines += [f"| {report['classes'][i]} | {report['classes'][j]} | {n} |" for i, j, n in pairs]
+    else:
+        lines.append("None.")
+    return "\n".join(lines) + "\n"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Cross-validated evaluation of the crop model.")
+    parser.add_argument("--folds", type=int, default=5, help="Stratified CV folds")
+    parser.add_argument("--jobs", type=int, default=None, help="Worker processes (default: one per fold, up to all cores)")
+    parser.add_argument("--json", default=REPORT_JSON, help="Where to write the JSON report")
+    parser.add_argument("--markdown", default=REPORT_MD, help="Where to write the Markdown report")
+    args = parser.parse_args(argv)
+
+    report = evaluate(args.folds, args.jobs)
+    os.makedirs(os.path.dirname(args.json) or ".", exist_ok=True)
+    with open(args.json, "w") as f:
+        json.dump(report, f, indent=2)
+    markdown = format_report(report)
+    with open(args.markdown, "w") as f:
+        f.write(markdown)
+    print(markdown)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+import joblib
+import numpy as np
+
+FOREST_PATH = "models/crop_yield_forest.pkl"
+
+# Rows traversed per block, keeps the (rows, trees) index matrices small
+BLOCK_ROWS = 512
+
+
+# Bumped when the saved layout changes, so an older export is recompiled instead of misread
+FORMAT = 2
+
+
+class CompiledForest:
+    """A fitted RandomForestClassifier flattened into contiguous arrays, so all trees are walked together.
+
+    Child indices count from the tree's ``roots[t]`` and leaves point to themselves;
+    ``leaf`` maps leaf nodes to their ``value`` rows.
+    """
+
+    def __init__(self, feature, threshold, children, value, leaf, roots, max_depth, classes):
+        self.feature = feature
+        self.threshold = threshold
+        self.children = children
+        self.value = value
+        self.leaf = leaf
+        self.roots = roots
+        self.max_depth = int(max_depth)
+        self.classes_ = classes
+
+    @property
+    def n_trees(self):
+        return len(self.roots)
+
+    def to_arrays(self):
+        return {
+            "format": FORMAT,
+            "feature": self.feature,
+            "threshold": self.threshold,
+            "children": self.children,
+            "value": self.value,
+            "leaf": self.leaf,
+            "roots": self.roots,
+            "max_depth": self.max_depth,
+            "classes": self.classes_,
+        }
+
+    @classmethod
+    def from_arrays(cls, arrays):
+        arrays = dict(arrays)
+        if arrays.pop("format", None) != FORMAT:
+            raise ValueError("Forest export is in an older format; retrain with src/train.py")
+        return cls(**arrays)
+
+    def apply(self, X):
+        """Return the global leaf index reached in every tree, shape (n, n_trees)."""
+        # sklearn compares float32 inputs against float64 thresholds
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        n_rows, n_features = X.shape
+        flat = X.ravel()
+        row_base = (np.arange(n_rows, dtype=np.intp) * n_features)[:, None]
+        roots = np.asarray(self.roots, dtype=np.intp)[None, :]
+        nodes = np.repeat(roots, n_rows, axis=0)
+        step = np.empty_like(nodes)
+        for _ in range(self.max_depth):
+            go_right = flat.take(row_base + self.feature.take(nodes)) > self.threshold.take(nodes)
+            # In place: step = 2 * node + go_right, then node = root + child index in its tree
+            np.multiply(nodes, 2, out=step)
+            step += go_right
+            np.add(roots, self.children.take(step), out=nodes)
+        return nodes
+
+    def predict_proba(self, X):
+        X = np.asarray(X)
+        if X.ndim == 1:
+            X = X.reshape(1, -1)
+        proba = np.empty((len(X), self.value.shape[1]), dtype=np.float64)
+        for start in range(0, len(X), BLOCK_ROWS):
+            leaves = self.leaf.take(self.apply(X[start:start + BLOCK_ROWS]))
+            # Reduces over trees in order, matching the forest's running sum
+            block = np.add.reduce(self.value[leaves], axis=1, dtype=np.float64)
+            block /= self.n_trees
+            proba[start:start + BLOCK_ROWS] = block
+        return proba
+
+    def predict(self, X):
+        return self.classes_.take(np.argmax(self.predict_proba(X), axis=1), axis=0)
+
+
+def _float32_floor(threshold):
+    # Largest float32 not above each threshold; inputs are compared as float32, so splits are unchanged
+    threshold32 = threshold.astype(np.float32)
+    rounded_up = threshold32.astype(np.float64) > threshold
+    threshold32[rounded_up] = np.nextafter(threshold32[rounded_up], np.float32(-np.inf))
+    return threshold32
+
+
+def compile_forest(model):
+    """Flatten a fitted single-output RandomForestClassifier."""
+    trees = [est.tree_ for est in model.estimators_]
+    n_classes = int(model.n_classes_)
+
+    feature, threshold, left, right, value, is_leaf = [], [], [], [], [], []
+    roots = np.zeros(len(trees), dtype=np.int32)
+    position = 0
+    for t, tree in enumerate(trees):
+        roots[t] = position
+
+        node = np.arange(tree.node_count)
+        leaf = tree.children_left == -1
+        feature.append(np.where(leaf, 0, tree.feature))
+        threshold.append(tree.threshold)
+        left.append(np.where(leaf, node, tree.children_left))
+        right.append(np.where(leaf, node, tree.children_right))
+
+        tree_value = tree.value[leaf, 0, :n_classes].astype(np.float64)
+        # Older sklearn stores class counts and normalizes at predict time
+        sums = tree_value.sum(axis=1, keepdims=True)
+        if np.any(sums > 1.0 + 1e-9):
+            sums[sums == 0.0] = 1.0
+            tree_value = tree_value / sums
+        value.append(tree_value)
+        is_leaf.append(leaf)
+        position += tree.node_count
+
+    largest = max(tree.node_count for tree in trees)
+    children = np.empty(2 * position, dtype=np.int16 if largest < 2 ** 15 else np.int32)
+    children[0::2] = np.concatenate(left)
+    children[1::2] = np.concatenate(right)
+    is_leaf = np.concatenate(is_leaf)
+    leaf = np.zeros(position, dtype=np.int32)
+    leaf[is_leaf] = np.arange(is_leaf.sum(), dtype=np.int32)
+    return CompiledForest(
+        feature=np.concatenate(feature).astype(np.min_scalar_type(-model.n_features_in_)),
+        threshold=_float32_floor(np.concatenate(threshold).astype(np.float64)),
+        children=children,
+        value=np.ascontiguousarray(np.concatenate(value)),
+        leaf=leaf,
+        roots=roots,
+        max_depth=max(t.max_depth for t in trees),
+        classes=np.asarray(model.classes_),
+    )
+
+
+def save_forest(forest, path=FOREST_PATH):
+    # Uncompressed so every array can be memory-mapped back by load_forest()
+    joblib.dump(forest.to_arrays(), path, compress=0)
+
+
+def load_forest(path=FOREST_PATH, mmap_mode="r"):
+    """Open a saved forest; with mmap_mode="r" worker processes share its pages."""
+    return CompiledForest.from_arrays(joblib.load(path, mmap_mode=mmap_mode))
@@ -0,0 +1,147 @@
+"""Image ingestion for the leaf model.
+
+JPEGs are decoded at reduced scale, and size limits are checked from the header before decoding.
+"""
+import os
+import struct
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+
+# Upload limits, checked before anything is decoded
+MAX_BYTES = int(float(os.environ.get("LEAF_MAX_UPLOAD_MB", 25)) * 2**20)
+MAX_PIXELS = int(float(os.environ.get("LEAF_MAX_MEGAPIXELS", 50)) * 1e6)
+
+# Width of the JPEG previews sent to the browser
+THUMBNAIL_WIDTH = 320
+
+# JPEG start-of-frame markers (every SOFn except DHT, JPG and DAC)
+SOF_MARKERS = frozenset(range(0xC0, 0xD0)) - {0xC4, 0xC8, 0xCC}
+
+
+class ImageTooLarge(ValueError):
+    """An upload over MAX_BYTES or MAX_PIXELS, rejected before decoding."""
+
+
+def check_limits(data, max_bytes=MAX_BYTES, max_pixels=MAX_PIXELS):
+    """Raise ImageTooLarge when ``data`` or the image its header describes is over the limits."""
+    if len(data) > max_bytes:
+        raise ImageTooLarge(f"{len(data) / 2**20:.1f} MB file, limit {max_bytes / 2**20:.0f} MB")
+    dims = image_size(data)
+    if dims is not None and dims[0] * dims[1] > max_pixels:
+        raise ImageTooLarge(f"{dims[0]}x{dims[1]} image, limit {max_pixels / 1e6:.0f} MP")
+
+
+def image_size(data):
+    """Return (width, height) from a JPEG or PNG header, or None for anything else."""
+    if data[:8] == PNG_SIGNATURE and data[12:16] == b"IHDR":
+        return struct.unpack(">II", data[16:24])
+
+    if data[:2] != b"\xff\xd8":
+        return None
+    i, n = 2, len(data)
+    while i + 9 <= n:
+        if data[i] != 0xFF:
+            return None
+        marker = data[i + 1]
+        if marker == 0xFF:
+            # Fill byte before a marker
+            i += 1
+        elif marker in SOF_MARKERS:
+            height, width = struct.unpack(">HH", data[i + 5:i + 9])
+            return width, height
+        elif marker == 0x01 or 0xD0 <= marker <= 0xD8:
+            # Markers without a length field
+            i += 2
+        else:
+            i += 2 + struct.unpack(">H", data[i + 2:i + 4])[0]
+    return None
+
+
+def is_jpeg(data):
+    return data[:2] == b"\xff\xd8"
+
+
+def reduction_factor(width, height, size):
+    """Largest JPEG scale-down (8, 4, 2 or 1) that keeps both sides at least ``size``."""
+    for factor in (8, 4, 2):
+        if min(width, height) // factor >= size:
+            return factor
+    return 1
+
+
+def decode(data, size):
+    """Decode image bytes to BGR, at reduced resolution when a JPEG is much larger than ``size``.
+
+    Returns None when the bytes are unreadable or over the upload limits.
+    """
+    import cv2
+    flags = {1: cv2.IMREAD_COLOR, 2: cv2.IMREAD_REDUCED_COLOR_2,
+             4: cv2.IMREAD_REDUCED_COLOR_4, 8: cv2.IMREAD_REDUCED_COLOR_8}
+
+    buffer = np.frombuffer(data, dtype=np.uint8)
+    if buffer.size == 0:
+        return None
+    try:
+        check_limits(data)
+    except ImageTooLarge:
+        return None
+    factor = 1
+    dims = image_size(data) if is_jpeg(data) else None
+    if dims is not None:
+        factor = reduction_factor(*dims, size)
+    try:
+        return cv2.imdecode(buffer, flags[factor])
+    except cv2.error:
+        return None
+
+
+def resize(image, size):
+    """Squash a BGR image to (size, size, 3), averaging pixels when shrinking."""
+    import cv2
+    shrinking = image.shape[0] >= size and image.shape[1] >= size
+    return cv2.resize(image, (size, size), interpolation=cv2.INTER_AREA if shrinking else cv2.INTER_LINEAR)
+
+
+def load_batch(blobs, size, max_workers=None):
+    """Decode and resize many images on a thread pool into one (n_ok, size, size, 3) batch.
+
+    Returns ``(batch, images)``, with None in ``images`` where a blob was unreadable.
+    """
+    batch = np.empty((len(blobs), size, size, 3), dtype=np.uint8)
+
+    def load(i):
+        image = decode(blobs[i], size)
+        if image is not None:
+            # Each thread writes its own row of the preallocated batch
+            batch[i] = resize(image, size)
+        return image
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        images = list(pool.map(load, range(len(blobs))))
+    ok = np.array([image is not None for image in images], dtype=bool)
+    return (batch if ok.all() else batch[ok]), images
+
+
+def encode_jpeg(image, quality=85):
+    import cv2
+    return cv2.imencode(".jpg", image, [cv2.IMWRITE_JPEG_QUALITY, quality])[1].tobytes()
+
+
+def thumbnail(data, width=THUMBNAIL_WIDTH, quality=85):
+    """Small JPEG preview of image bytes, decoded at the lowest resolution that covers ``width``, or None."""
+    import cv2
+    image = decode(data, width)
+    if image is None:
+        return None
+    height = max(1, round(image.shape[0] * width / image.shape[1]))
+    if image.shape[1] > width:
+        image = cv2.resize(image, (width, height), interpolation=cv2.INTER_AREA)
+    return encode_jpeg(image, quality)
+
+
+def thumbnails(blobs, width=THUMBNAIL_WIDTH, max_workers=None):
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        return list(pool.map(lambda data: thumbnail(data, width), blobs))
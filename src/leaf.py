@@ -0,0 +1,217 @@
+import hashlib
+import os
+import threading
+
+import numpy as np
+
+from src.images import load_batch
+from src.lru import LRUCache
+
+MODEL_PATH = os.path.join("models", "plant_disease_model.h5")
+
+# TFLite exports written by src/convert_leaf.py
+TFLITE_PATHS = {
+    "tflite": os.path.join("models", "plant_disease_model.tflite"),
+    "tflite-int8": os.path.join("models", "plant_disease_model_int8.tflite"),
+}
+BACKENDS = ("keras",) + tuple(TFLITE_PATHS)
+
+# Backend used when none is passed; set LEAF_BACKEND=tflite-int8 on CPU-only servers
+DEFAULT_BACKEND = os.environ.get("LEAF_BACKEND", "keras")
+
+# Diagnoses kept in memory, and an optional directory that persists them across restarts
+CACHE_SIZE = int(os.environ.get("LEAF_CACHE_SIZE", 4096))
+CACHE_DIR = os.environ.get("LEAF_CACHE_DIR")
+
+IMAGE_SIZE = 256
+
+CLASS_NAMES = (
+    'Tomato-Bacterial_spot',
+    'Potato-Barly blight',
+    'Corn-Common_rust'
+)
+
+_models = {}
+_model_lock = threading.Lock()
+
+
+class TFLiteModel:
+    """A converted leaf model behind the same ``predict(batch)`` call as Keras.
+
+    The interpreter is resized to each batch and is not thread-safe, so
+    calls are serialized; it uses every core for a single invoke instead.
+    """
+
+    def __init__(self, path):
+        # The standalone runtime is a few MB; full TensorFlow works too
+        try:
+            from tflite_runtime.interpreter import Interpreter
+        except ImportError:
+            import tensorflow as tf
+            Interpreter = tf.lite.Interpreter
+        self.path = path
+        self.interpreter = Interpreter(model_path=path, num_threads=os.cpu_count())
+        self.input = self.interpreter.get_input_details()[0]
+        self.output = self.interpreter.get_output_details()[0]
+        self._lock = threading.Lock()
+        self._shape = None
+
+    def predict(self, batch, verbose=0):
+        batch = np.ascontiguousarray(batch, dtype=self.input["dtype"])
+        with self._lock:
+            if batch.shape != self._shape:
+                self.interpreter.resize_tensor_input(self.input["index"], batch.shape)
+                self.interpreter.allocate_tensors()
+                self._shape = batch.shape
+            self.interpreter.set_tensor(self.input["index"], batch)
+            self.interpreter.invoke()
+            return self.interpreter.get_tensor(self.output["index"]).copy()
+
+
+def available_backends():
+    """Backends whose model file exists, Keras first."""
+    paths = dict(TFLITE_PATHS, keras=MODEL_PATH)
+    return [name for name in BACKENDS if os.path.exists(paths[name])]
+
+
+def load_disease_model(backend=None):
+    """Load the leaf model for ``backend`` (keras, tflite or tflite-int8) once per process."""
+    backend = backend or DEFAULT_BACKEND
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown leaf backend {backend!r}, expected one of {BACKENDS}")
+    model = _models.get(backend)
+    if model is None:
+        with _model_lock:
+            model = _models.get(backend)
+            if model is None:
+                if backend == "keras":
+                    from keras.models import load_model
+                    model = load_model(MODEL_PATH)
+                else:
+                    model = TFLiteModel(TFLITE_PATHS[backend])
+                _models[backend] = model
+    return model
+
+
+def prepare_batch(blobs, max_workers=None):
+    """Decode and resize many uploads concurrently into one (n, 256, 256, 3) batch.
+
+    See src.images.load_batch(); unreadable uploads come back as None in
+    the returned images list and are left out of the batch.
+    """
+    return load_batch(blobs, IMAGE_SIZE, max_workers)
+
+
+def predict_leaf(batch, backend=None):
+    """Class probabilities for a (n, 256, 256, 3) batch."""
+    return load_disease_model(backend).predict(batch, verbose=0)
+
+
+def model_version(backend=None):
+    """Identify the model file behind ``backend``, so a retrained model misses the cache."""
+    backend = backend or DEFAULT_BACKEND
+    path = MODEL_PATH if backend == "keras" else TFLITE_PATHS[backend]
+    st = os.stat(path)
+    return f"{backend}-{st.st_mtime_ns}-{st.st_size}"
+
+
+class DiagnosisCache(LRUCache):
+    """LRU of leaf class probabilities keyed on a hash of the uploaded bytes.
+
+    Keys include the model version, so entries of an older model are
+    never returned. With ``directory`` set, every entry is also written
+    there as a small .npy file and read back on a memory miss, so
+    diagnoses survive restarts and are shared between processes.
+    """
+
+    def __init__(self, capacity=CACHE_SIZE, directory=CACHE_DIR):
+        super().__init__(capacity)
+        self.directory = directory
+        self.disk_hits = 0
+
+    @staticmethod
+    def digest(data):
+        # blake2b hashes at several GB/s, far below decode cost
+        return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+    def _path(self, key):
+        version, digest = key
+        return os.path.join(self.directory, version, digest + ".npy")
+
+    def get(self, key):
+        proba = self._touch(key)
+        if proba is not None:
+            self._count("hits")
+            return proba
+        if self.directory is not None:
+            try:
+                proba = np.load(self._path(key))
+            except (FileNotFoundError, ValueError, OSError):
+                proba = None
+            if proba is not None:
+                super().put(key, proba)
+                self._count("disk_hits")
+                return proba
+        self._count("misses")
+        return None
+
+    def put(self, key, proba):
+        proba = np.asarray(proba, dtype=np.float32)
+        super().put(key, proba)
+        if self.directory is not None:
+            path = self._path(key)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Written under a unique name and renamed, so readers never see a partial file
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "wb") as f:
+                np.save(f, proba)
+            os.replace(tmp_path, path)
+
+    def stats(self):
+        with self._lock:
+            stats = super().stats()
+            lookups = self.hits + self.disk_hits + self.misses
+            stats["disk_hits"] = self.disk_hits
+            stats["hit_rate"] = (self.hits + self.disk_hits) / lookups if lookups else 0.0
+            return stats
+
+
+diagnosis_cache = DiagnosisCache()
+
+
+def diagnose(blobs, backend=None, predict=None, cache=diagnosis_cache):
+    """Class probabilities for every uploaded image, or None where it is unreadable.
+
+    Uploads already in ``cache`` skip decode, resize and inference;
+    identical uploads in one call are run once. The rest go through one
+    prepare_batch() and one batched predict. ``predict`` replaces the
+    local model (e.g. an inference client's leaf_proba); pass cache=None
+    when its model version is not known here.
+    """
+    if predict is None:
+        def predict(batch):
+            return predict_leaf(batch, backend)
+    version = model_version(backend) if cache is not None else None
+    keys = [(version, DiagnosisCache.digest(data)) for data in blobs]
+
+    results = [cache.get(key) if cache is not None else None for key in keys]
+    pending = {}
+    for i, key in enumerate(keys):
+        if results[i] is None:
+            pending.setdefault(key, []).append(i)
+    if not pending:
+        return results
+
+    first = [indices[0] for indices in pending.values()]
+    batch, images = prepare_batch([blobs[i] for i in first])
+    scores = iter(predict(batch) if len(batch) else ())
+    for key, image in zip(pending, images):
+        if image is None:
+            continue
+        # float32 like the cache, so a repeat upload gets the very same values
+        proba = np.asarray(next(scores), dtype=np.float32)
+        if cache is not None:
+            cache.put(key, proba)
+        for i in pending[key]:
+            results[i] = proba
+    return results
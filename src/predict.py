@@ -1,27 +1,398 @@
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+import warnings
+
 import joblib
 import numpy as np
+import pandas as pd
+
+from src.centroid import CENTROIDS_PATH, load_centroids
+from src.client import get_client
+from src.forest import FOREST_PATH, compile_forest, load_forest
+from src.lru import LRUCache
+from src.preprocess import file_digest
+from src.schema import FEATURES, format_violations, validate
+
+MODEL_PATH = "models/crop_yield_model.pkl"
+ENCODER_PATH = "models/label_encoder.pkl"
+MANIFEST_PATH = "models/crop_yield_model.json"
+
+# Set CROP_CASCADE=0 to send every label prediction through the forest
+CASCADE_ENABLED = os.environ.get("CROP_CASCADE", "1") != "0"
+
+# From this many rows sklearn's batched predict beats the compiled forest
+SKLEARN_MIN_ROWS = 512
+
+# Resolution of the Crop Prediction sliders, used to quantize cache keys
+QUANT_STEPS = {"N": 1, "P": 1, "K": 1, "temperature": 1, "humidity": 1, "ph": 0.1, "rainfall": 1}
+
+
+def check_manifest(path=MANIFEST_PATH):
+    """Check train.py's manifest against this process: a feature mismatch raises, a sklearn version mismatch warns."""
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        manifest = json.load(f)
+
+    if manifest.get("features", FEATURES) != FEATURES:
+        raise ValueError(f"Model was trained on features {manifest['features']}, expected {FEATURES}")
+
+    import sklearn
+    trained = manifest.get("sklearn_version")
+    if trained and trained.split(".")[:2] != sklearn.__version__.split(".")[:2]:
+        warnings.warn(
+            f"Crop model was trained with scikit-learn {trained} but {sklearn.__version__} is installed; "
+            "retrain with src/train.py if predictions look wrong."
+        )
+    return manifest
+
+
+class ModelRegistry:
+    """Process-wide crop model, encoder and compiled forest, reloaded when train.py rewrites them."""
+
+    def __init__(self, model_path=MODEL_PATH, encoder_path=ENCODER_PATH, forest_path=FOREST_PATH,
+                 manifest_path=MANIFEST_PATH, centroids_path=CENTROIDS_PATH):
+        self.model_path = model_path
+        self.encoder_path = encoder_path
+        self.forest_path = forest_path
+        self.centroids_path = centroids_path
+        self.manifest_path = manifest_path
+        self.manifest = None
+        self._model_digest = None
+        self.version = 0
+        self._lock = threading.Lock()
+        self._entry = None
+
+    def _signature(self):
+        sig = []
+        for path in (self.model_path, self.encoder_path):
+            st = os.stat(path)
+            sig.append((st.st_mtime_ns, st.st_size))
+        # The manifest is written last, so its change triggers a reload with matching digests
+        for path in (self.forest_path, self.centroids_path, self.manifest_path):
+            try:
+                st = os.stat(path)
+                sig.append((st.st_mtime_ns, st.st_size))
+            except FileNotFoundError:
+                sig.append(None)
+        return tuple(sig)
+
+    def get(self):
+        entry = self._current()
+        if entry[1] is None:
+            with self._lock:
+                entry = self._entry
+                if entry[1] is None:
+                    entry = (entry[0], joblib.load(self.model_path)) + entry[2:]
+                    self._entry = entry
+        return entry[1], entry[2]
+
+    def get_compiled(self):
+        _, _, encoder, forest, _ = self._current()
+        return forest, encoder
+
+    def get_cascade(self):
+        """Return (centroids, forest, encoder); centroids is None without a fast path."""
+        _, _, encoder, forest, centroids = self._current()
+        return centroids, forest, encoder
+
+    def _matching(self, path):
+        """True when ``path`` has the SHA-1 the manifest records for it, like the model file."""
+        if not os.path.exists(path):
+            return False
+        digests = {os.path.basename(p): d for p, d in (self.manifest or {}).get("artifacts", {}).items()}
+        model_digest = digests.get(os.path.basename(self.model_path))
+        if self._model_digest is None or self._model_digest != model_digest:
+            # An unrecognised model: its export and fast path are not trusted
+            warnings.warn(f"{path} is ignored: {self.model_path} does not match {self.manifest_path}")
+            return False
+        if digests.get(os.path.basename(path)) != file_digest(path):
+            warnings.warn(f"{path} is ignored: it was not written with {self.model_path}")
+            return False
+        return True
+
+    def _load(self, sig):
+        self.manifest = check_manifest(self.manifest_path)
+        encoder = joblib.load(self.encoder_path)
+        self._model_digest = file_digest(self.model_path) if self.manifest else None
+        # Centroids calibrated against another model would not match its trees
+        centroids = load_centroids(self.centroids_path) if self._matching(self.centroids_path) else None
+        if self._matching(self.forest_path):
+            try:
+                # train.py replaces files by rename, so old mappings stay valid
+                return None, encoder, load_forest(self.forest_path, mmap_mode="r"), centroids
+            except ValueError as e:
+                warnings.warn(f"{self.forest_path} is ignored: {e}")
+        model = joblib.load(self.model_path)
+        return model, encoder, compile_forest(model), centroids
+
+    def _current(self):
+        entry = self._entry
+        try:
+            sig = self._signature()
+        except FileNotFoundError:
+            # Artifacts are being rewritten; keep serving what we have
+            if entry is not None:
+                return entry
+            raise
+
+        if entry is not None and entry[0] == sig:
+            return entry
+
+        with self._lock:
+            entry = self._entry
+            if entry is None or entry[0] != sig:
+                # Single assignment so readers never see a mixed set
+                entry = (sig,) + self._load(sig)
+                self._entry = entry
+                self.version += 1
+        return entry
+
+    def clear(self):
+        with self._lock:
+            self._entry = None
+
+
+registry = ModelRegistry()
+
 
 def load_model():
-    model = joblib.load("models/crop_yield_model.pkl")
-    encoder = joblib.load("models/label_encoder.pkl")
-    return model, encoder
+    return registry.get()
+
+
+class CascadeStats:
+    """Counts of label predictions answered by the centroid fast path vs the forest."""
+
+    def __init__(self):
+        self.fast = 0
+        self.fallback = 0
+        self._lock = threading.Lock()
+
+    def record(self, fast, fallback):
+        with self._lock:
+            self.fast += fast
+            self.fallback += fallback
+
+    def stats(self):
+        with self._lock:
+            total = self.fast + self.fallback
+            return {
+                "fast": self.fast,
+                "fallback": self.fallback,
+                "hit_rate": self.fast / total if total else 0.0,
+            }
+
+
+cascade_stats = CascadeStats()
+
+
+def _forest_proba(forest, X):
+    # Compiled trees for small inputs, sklearn's batched predict for large ones
+    if len(X) >= SKLEARN_MIN_ROWS:
+        model, _ = registry.get()
+        return model.predict_proba(pd.DataFrame(X, columns=FEATURES))
+    return forest.predict_proba(X)
+
+
+def cascade_proba(X):
+    """In-process (probabilities, labels) for the rows of X, through the centroid fast path when it is confident."""
+    centroids, forest, encoder = registry.get_cascade()
+    labels = encoder.inverse_transform(forest.classes_)
+    if centroids is None or not CASCADE_ENABLED:
+        return _forest_proba(forest, X), labels
+
+    proba, accepted = centroids.predict_proba(X)
+    fallback = np.flatnonzero(~accepted)
+    if len(fallback):
+        # Only the ambiguous or out-of-range rows walk the trees
+        proba[fallback] = _forest_proba(forest, X[fallback])
+    cascade_stats.record(len(X) - len(fallback), len(fallback))
+    return proba, labels
+
+
+def _crop_proba(X):
+    # Hand off to the shared inference server when AGRI_INFERENCE_ADDR is set
+    client = get_client()
+    if client is not None:
+        return client.crop_proba(X)
+    return cascade_proba(X)
+
+
+def _predict_labels(X):
+    proba, labels = _crop_proba(X)
+    return labels[np.argmax(proba, axis=1)]
+
 
 def predict_crop(features):
-    model, encoder = load_model()
-
-    X = np.array([
-        [
-            features["N"],
-            features["P"],
-            features["K"],
-            features["temperature"],
-            features["humidity"],
-            features["ph"],
-            features["rainfall"]
-        ]
-    ])
-
-    prediction = model.predict(X)
-    crop = encoder.inverse_transform(prediction)[0]
+    # Raises SchemaError for a missing feature or an out-of-range value
+    X, _, _ = validate(features)
+
+    crop = _predict_labels(X)[0]
 
     return crop
+
+
+def _top_k(proba, labels, k):
+    """Best-first labels and scores of the k largest columns of each row; ties go to the lower class index."""
+    k = max(1, min(k, proba.shape[1]))
+    kth = -np.partition(-proba, k - 1, axis=1)[:, k - 1:k]
+    above = proba > kth
+    tied = proba == kth
+    needed = k - above.sum(axis=1, keepdims=True)
+    chosen = above | (tied & (np.cumsum(tied, axis=1) <= needed))
+    idx = np.nonzero(chosen)[1].reshape(len(proba), k)
+
+    scores = np.take_along_axis(proba, idx, axis=1)
+    order = np.argsort(-scores, axis=1, kind="stable")
+    idx = np.take_along_axis(idx, order, axis=1)
+    return labels[idx], np.take_along_axis(scores, order, axis=1)
+
+
+def predict_top_k(features, k=3):
+    """Return [(crop, probability), ...] for the k most likely crops."""
+    X, _, _ = validate(features)
+    proba, labels = _crop_proba(X)
+    crops, scores = _top_k(proba, labels, k)
+    return list(zip(crops[0].tolist(), scores[0].tolist()))
+
+
+class PredictionCache(LRUCache):
+    """LRU of predictions keyed on the quantized feature tuple, emptied when the registry version changes."""
+
+    def __init__(self, capacity=1024, steps=QUANT_STEPS):
+        super().__init__(capacity)
+        self.steps = steps
+        self._version = None
+
+    def quantize(self, features):
+        return tuple(int(round(features[name] / self.steps[name])) for name in FEATURES)
+
+    def dequantize(self, key):
+        return {name: q * self.steps[name] for name, q in zip(FEATURES, key)}
+
+    def get(self, key, version):
+        with self._lock:
+            if version != self._version:
+                self._data.clear()
+                self._version = version
+            return super().get(key)
+
+    def put(self, key, value, version):
+        with self._lock:
+            if version == self._version:
+                super().put(key, value)
+
+
+prediction_cache = PredictionCache(capacity=int(os.environ.get("CROP_CACHE_SIZE", 1024)))
+
+
+def predict_top_k_cached(features, k=3):
+    """predict_top_k() for slider inputs snapped to QUANT_STEPS, answered from the LRU when possible."""
+    # Only the inference server knows when its model was reloaded, so it is not cached here
+    if get_client() is not None:
+        return predict_top_k(features, k)
+
+    validate(features)
+    key = prediction_cache.quantize(features)
+    # Touch the registry first so a reload bumps the version before lookup
+    registry.get_compiled()
+    version = registry.version
+
+    entry = prediction_cache.get(key, version)
+    if entry is None:
+        snapped = prediction_cache.dequantize(key)
+        entry = _crop_proba(np.array([[snapped[name] for name in FEATURES]]))
+        prediction_cache.put(key, entry, version)
+
+    proba, labels = entry
+    crops, scores = _top_k(proba, labels, k)
+    return list(zip(crops[0].tolist(), scores[0].tolist()))
+
+
+def predict_batch(X, errors="raise"):
+    """Predict crop labels for a DataFrame or (n, 7) array; errors is passed to src.schema.validate()."""
+    X, valid, _ = validate(X, errors)
+    labels = np.full(len(X), None, dtype=object)
+    if valid.any():
+        labels[valid] = _predict_labels(X if valid.all() else X[valid])
+    return labels
+
+
+def predict_batch_top_k(X, k=3, errors="raise"):
+    """Top-k crops per row as a DataFrame with crop_1..k and prob_1..k columns; masked rows are left empty."""
+    X, valid, _ = validate(X, errors)
+    proba, labels = _crop_proba(X[valid]) if valid.any() else (None, None)
+    if proba is not None:
+        k = min(k, proba.shape[1])
+    k = max(1, k)
+    columns = [f"{kind}_{i}" for i in range(1, k + 1) for kind in ("crop", "prob")]
+    if len(X) == 0:
+        return pd.DataFrame(columns=columns)
+
+    crops = np.full((len(X), k), None, dtype=object)
+    scores = np.full((len(X), k), np.nan)
+    if proba is not None:
+        crops[valid], scores[valid] = _top_k(proba, labels, k)
+    result = {}
+    for i in range(k):
+        result[f"crop_{i + 1}"] = crops[:, i]
+        result[f"prob_{i + 1}"] = scores[:, i]
+    return pd.DataFrame(result, columns=columns)
+
+
+def predict_chunks(chunks, errors="raise"):
+    """Yield one label array per chunk from an iterator of DataFrames/arrays."""
+    for chunk in chunks:
+        yield predict_batch(chunk, errors)
+
+
+def score_csv(input_path, output_path, chunksize=50000, label_column="prediction", top_k=0, errors="mask"):
+    """Stream input_path to output_path with a prediction column (and top_k crop/prob columns), one chunk at a time."""
+    rows = 0
+    violations = {}
+    start = time.perf_counter()
+    reader = pd.read_csv(input_path, chunksize=chunksize)
+    for i, chunk in enumerate(reader):
+        # Validated here for the counts; with errors="clip" X is already in range
+        X, _, chunk_violations = validate(chunk, errors)
+        for name, n in chunk_violations.items():
+            violations[name] = violations.get(name, 0) + n
+        if top_k > 0:
+            ranked = predict_batch_top_k(X, top_k, errors="mask")
+            chunk[label_column] = ranked["crop_1"].to_numpy()
+            for column in ranked.columns:
+                chunk[column] = ranked[column].to_numpy()
+        else:
+            chunk[label_column] = predict_batch(X, errors="mask")
+        chunk.to_csv(output_path, mode="w" if i == 0 else "a", header=(i == 0), index=False)
+        rows += len(chunk)
+    elapsed = time.perf_counter() - start
+    return rows, elapsed, violations
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Score a CSV of field records with the crop model.")
+    parser.add_argument("input", help="CSV with columns " + ",".join(FEATURES))
+    parser.add_argument("output", help="Destination CSV (input columns plus the prediction)")
+    parser.add_argument("--chunksize", type=int, default=50000, help="Rows read and scored per chunk")
+    parser.add_argument("--label-column", default="prediction", help="Name of the output column")
+    parser.add_argument("--top-k", type=int, default=0, help="Also write the k best crops and their probabilities")
+    parser.add_argument("--errors", choices=["mask", "clip", "raise"], default="mask",
+                        help="Out-of-range rows: leave unscored, clip into range, or abort")
+    args = parser.parse_args(argv)
+
+    rows, elapsed, violations = score_csv(
+        args.input, args.output, args.chunksize, args.label_column, args.top_k, args.errors,
+    )
+    rate = rows / elapsed if elapsed > 0 else float("inf")
+    print(f"Scored {rows} rows in {elapsed:.2f}s ({rate:,.0f} rows/sec)", file=sys.stderr)
+    if violations:
+        print(f"Out-of-range values: {format_violations(violations)}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,143 @@
+import hashlib
+import json
+import os
+
+import numpy as np
 import pandas as pd
 
-def load_dataset(path):
+from src.schema import DTYPES, FEATURES, validate
+
+CACHE_DIR = os.path.join("data", ".cache")
+
+
+def file_digest(path):
+    digest = hashlib.sha1()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _cache_dir(path):
+    # Readable name plus a hash of the absolute path, so same-named CSVs get separate caches
+    source = os.path.abspath(path)
+    name = os.path.splitext(os.path.basename(path))[0]
+    return os.path.join(CACHE_DIR, f"{name}-{hashlib.sha1(source.encode()).hexdigest()[:12]}")
+
+
+def _write_meta(cache_dir, meta):
+    # Replaced in one rename, so readers never see a half-written meta.json
+    tmp_path = os.path.join(cache_dir, "meta.json.tmp")
+    with open(tmp_path, "w") as f:
+        json.dump(meta, f, indent=2)
+    os.replace(tmp_path, os.path.join(cache_dir, "meta.json"))
+
+
+def build_column_cache(path):
+    """Parse the CSV once and store one .npy file per column.
+
+    Feature columns are stored in their schema dtype (float32, what the
+    trees use anyway), other numeric columns as float64, and text columns
+    as categorical codes plus their categories.
+    """
     df = pd.read_csv(path)
-    return df
+    cache_dir = _cache_dir(path)
+    os.makedirs(cache_dir, exist_ok=True)
+
+    columns = []
+    for name in df.columns:
+        if pd.api.types.is_numeric_dtype(df[name]):
+            dtype = np.dtype(DTYPES.get(name, np.float64))
+            np.save(os.path.join(cache_dir, f"{name}.npy"), df[name].to_numpy(dtype=dtype))
+            columns.append({"name": name, "kind": dtype.name})
+        else:
+            values = df[name].astype("category")
+            # int8 codes for up to 127 categories, wider only when needed
+            code_dtype = np.result_type(np.int8, np.min_scalar_type(-len(values.cat.categories)))
+            codes = values.cat.codes.to_numpy().astype(code_dtype)
+            np.save(os.path.join(cache_dir, f"{name}.codes.npy"), codes)
+            columns.append({"name": name, "kind": "category", "categories": values.cat.categories.tolist()})
+
+    st = os.stat(path)
+    meta = {
+        "source": os.path.abspath(path),
+        "sha1": file_digest(path),
+        "size": st.st_size,
+        "mtime_ns": st.st_mtime_ns,
+        "rows": len(df),
+        "columns": columns,
+    }
+    # meta.json is written last, so a half-built cache is never considered valid
+    _write_meta(cache_dir, meta)
+    return meta
+
+
+def _valid_meta(path):
+    meta_path = os.path.join(_cache_dir(path), "meta.json")
+    if not os.path.exists(meta_path):
+        return None
+    with open(meta_path) as f:
+        meta = json.load(f)
+
+    if meta.get("source") != os.path.abspath(path):
+        return None
+    st = os.stat(path)
+    if meta["size"] == st.st_size and meta["mtime_ns"] == st.st_mtime_ns:
+        return meta
+    # Touched but maybe unchanged; the content hash decides
+    if meta["size"] == st.st_size and meta["sha1"] == file_digest(path):
+        meta["mtime_ns"] = st.st_mtime_ns
+        _write_meta(_cache_dir(path), meta)
+        return meta
+    return None
+
+
+def _read_column_cache(path, meta, columns=None):
+    cache_dir = _cache_dir(path)
+    data = {}
+    for column in meta["columns"]:
+        name = column["name"]
+        if columns is not None and name not in columns:
+            continue
+        if column["kind"] == "category":
+            codes = np.load(os.path.join(cache_dir, f"{name}.codes.npy"))
+            data[name] = pd.Categorical.from_codes(codes, categories=column["categories"])
+        else:
+            data[name] = np.load(os.path.join(cache_dir, f"{name}.npy"))
+    return pd.DataFrame(data)
+
+
+def load_dataset(path, use_cache=True, columns=None):
+    """Load the dataset, through the binary column cache unless use_cache is False."""
+    if not use_cache:
+        df = pd.read_csv(path)
+        return df[columns] if columns is not None else df
+
+    meta = _valid_meta(path)
+    if meta is None:
+        meta = build_column_cache(path)
+    return _read_column_cache(path, meta, columns)
+
+
+def iter_dataset(path, chunksize=100000, columns=None, target_column="label"):
+    """Yield typed DataFrame chunks without loading the whole file.
+
+    Only ``columns`` are parsed (all by default). Feature columns come out
+    in their schema dtype and the target as categorical, like load_dataset().
+    """
+    header = pd.read_csv(path, nrows=0).columns
+    usecols = list(columns) if columns is not None else list(header)
+    dtype = {name: DTYPES[name] for name in usecols if name in DTYPES}
+    for chunk in pd.read_csv(path, usecols=usecols, dtype=dtype, chunksize=chunksize):
+        if target_column in chunk:
+            chunk[target_column] = chunk[target_column].astype("category")
+        yield chunk[usecols]
+
 
 def split_features_labels(df, target_column):
-    X = df.drop(target_column, axis=1)
+    # Schema columns in model order, without rows outside the physical ranges
+    _, valid, _ = validate(df, errors="mask")
+    df = df[valid]
+    X = df[FEATURES]
     y = df[target_column]
     return X, y
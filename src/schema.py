@@ -0,0 +1,91 @@
+"""Feature columns, dtypes and physical ranges shared by training and inference.
+
+Whole matrices are checked at once: one comparison against the lower and
+upper bounds per column gives a boolean mask of bad cells, from which the
+per-row verdict and per-column violation counts are both reductions.
+"""
+import numpy as np
+import pandas as pd
+
+# Column order the model is trained and queried with
+FEATURES = ["N", "P", "K", "temperature", "humidity", "ph", "rainfall"]
+
+# What the trees compare against; the validation itself runs in float64
+DTYPES = {name: np.float32 for name in FEATURES}
+
+# Dtype of a stacked (n, 7) feature matrix
+MATRIX_DTYPE = np.result_type(*DTYPES.values())
+
+# Physically plausible values, wide enough for every slider on the Crop Prediction page
+RANGES = {
+    "N": (0.0, 500.0),            # kg/ha
+    "P": (0.0, 500.0),            # kg/ha
+    "K": (0.0, 500.0),            # kg/ha
+    "temperature": (-10.0, 60.0),  # °C
+    "humidity": (0.0, 100.0),     # %
+    "ph": (0.0, 14.0),
+    "rainfall": (0.0, 5000.0),    # mm
+}
+
+LOWER = np.array([RANGES[name][0] for name in FEATURES])
+UPPER = np.array([RANGES[name][1] for name in FEATURES])
+
+
+class SchemaError(ValueError):
+    """Raised for missing columns or out-of-range values; ``violations`` counts bad cells per column."""
+
+    def __init__(self, message, violations=None):
+        super().__init__(message)
+        self.violations = violations or {}
+
+
+def as_matrix(X):
+    """Return a float64 (n, 7) matrix in FEATURES order from a DataFrame, dict or array."""
+    if isinstance(X, dict):
+        missing = [name for name in FEATURES if name not in X]
+        if missing:
+            raise SchemaError(f"Missing features {missing}")
+        return np.array([[X[name] for name in FEATURES]], dtype=np.float64)
+    if isinstance(X, pd.DataFrame):
+        missing = [name for name in FEATURES if name not in X.columns]
+        if missing:
+            raise SchemaError(f"Missing feature columns {missing}")
+        return X[FEATURES].to_numpy(dtype=np.float64)
+
+    X = np.asarray(X, dtype=np.float64)
+    if X.ndim == 1:
+        X = X.reshape(1, -1)
+    if X.ndim != 2 or X.shape[1] != len(FEATURES):
+        raise SchemaError(f"Expected {len(FEATURES)} feature columns {FEATURES}, got shape {X.shape}")
+    return X
+
+
+def check(X):
+    """Return (valid rows mask, {column: bad cell count}) for a matrix from as_matrix()."""
+    # NaN fails both comparisons, so it is caught without a separate isfinite pass
+    bad = ~((X >= LOWER) & (X <= UPPER))
+    counts = bad.sum(axis=0)
+    return ~bad.any(axis=1), {name: int(n) for name, n in zip(FEATURES, counts) if n}
+
+
+def validate(X, errors="raise"):
+    """Check X against RANGES and return (matrix, valid rows mask, violations).
+
+    errors="raise" raises SchemaError if any row is out of range;
+    "mask" only reports, so the caller can drop rows with ``matrix[valid]``;
+    "clip" pulls finite values into range, leaving just NaN rows invalid.
+    """
+    X = as_matrix(X)
+    valid, violations = check(X)
+    if errors == "clip" and violations:
+        X = np.clip(X, LOWER, UPPER)
+        valid = ~np.isnan(X).any(axis=1)
+    elif errors == "raise" and violations:
+        message = f"{int((~valid).sum())} of {len(X)} rows out of range ({format_violations(violations)})"
+        raise SchemaError(message, violations)
+    return X, valid, violations
+
+
+def format_violations(violations):
+    """One-line summary such as ``ph 0..14: 3, rainfall 0..5000: 1``."""
+    return ", ".join(f"{name} {RANGES[name][0]:g}..{RANGES[name][1]:g}: {n}" for name, n in violations.items())
@@ -0,0 +1,196 @@
+"""Local inference server holding the crop and leaf models once, micro-batching concurrent requests.
+
+    python -m src.server --socket /tmp/agri_inference.sock
+    AGRI_INFERENCE_ADDR=unix:/tmp/agri_inference.sock streamlit run ui/app.py
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from src.client import decode_array, encode_array
+from src.leaf import IMAGE_SIZE
+from src.predict import cascade_proba
+from src.schema import FEATURES
+
+DEFAULT_SOCKET = "/tmp/agri_inference.sock"
+
+
+class MicroBatcher:
+    """Queue of pending requests for one model, drained in micro-batches.
+
+    ``predict_fn`` maps the stacked rows to ``(output, info)``; ``info`` is shared by every request in the batch.
+    """
+
+    def __init__(self, predict_fn, executor, max_batch=64, max_wait=0.005):
+        self.predict_fn = predict_fn
+        self.executor = executor
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.batches = 0
+        self.rows = 0
+        self._queue = asyncio.Queue()
+
+    async def submit(self, rows):
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((rows, future))
+        return await future
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            pending = [await self._queue.get()]
+            size = len(pending[0][0])
+            deadline = loop.time() + self.max_wait
+            while size < self.max_batch:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self._queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                pending.append(item)
+                size += len(item[0])
+
+            try:
+                batch = np.concatenate([rows for rows, _ in pending])
+                try:
+                    output, info = await loop.run_in_executor(self.executor, self.predict_fn, batch)
+                except Exception:
+                    # Rerun each request alone so only the bad one gets the error
+                    for rows, future in pending:
+                        try:
+                            result = await loop.run_in_executor(self.executor, self.predict_fn, rows)
+                        except Exception as exc:
+                            if not future.done():
+                                future.set_exception(exc)
+                        else:
+                            if not future.done():
+                                future.set_result(result)
+                    continue
+
+                self.batches += 1
+                self.rows += len(batch)
+                start = 0
+                for rows, future in pending:
+                    if not future.done():
+                        future.set_result((output[start:start + len(rows)], info))
+                    start += len(rows)
+            except Exception as exc:
+                # Never let one batch end the loop; every later request would hang
+                for _, future in pending:
+                    if not future.done():
+                        future.set_exception(exc)
+
+    def stats(self):
+        return {
+            "batches": self.batches,
+            "rows": self.rows,
+            "mean_batch": self.rows / self.batches if self.batches else 0.0,
+        }
+
+
+def check_rows(op, rows):
+    """Reject a request whose array could not be stacked with the others in a micro-batch."""
+    if op == "crop":
+        if rows.ndim != 2 or rows.shape[1] != len(FEATURES) or rows.dtype.kind not in "fiu":
+            raise ValueError(f"crop rows must be numeric (n, {len(FEATURES)}), got {rows.dtype} {rows.shape}")
+    elif rows.ndim != 4 or rows.shape[1:] != (IMAGE_SIZE, IMAGE_SIZE, 3) or rows.dtype != np.uint8:
+        raise ValueError(f"leaf rows must be uint8 (n, {IMAGE_SIZE}, {IMAGE_SIZE}, 3), got {rows.dtype} {rows.shape}")
+
+
+def _crop_proba(X):
+    # Labels come from the same registry entry as the probabilities, even across a reload
+    proba, labels = cascade_proba(X)
+    return proba, labels.tolist()
+
+
+def _leaf_proba(images):
+    from src.leaf import predict_leaf
+    return np.asarray(predict_leaf(images)), None
+
+
+class InferenceServer:
+    def __init__(self, max_batch=64, max_wait=0.005, workers=2):
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+        self.batchers = {
+            "crop": MicroBatcher(_crop_proba, self.executor, max_batch, max_wait),
+            "leaf": MicroBatcher(_leaf_proba, self.executor, max_batch, max_wait),
+        }
+
+    async def handle_request(self, request):
+        op = request.get("op")
+        if op == "ping":
+            return {"ok": True}
+        if op == "stats":
+            return {"ok": True, "stats": {name: b.stats() for name, b in self.batchers.items()}}
+        if op in self.batchers:
+            rows = decode_array(request["rows"])
+            check_rows(op, rows)
+            output, labels = await self.batchers[op].submit(rows)
+            response = {"ok": True, "result": encode_array(output)}
+            if labels is not None:
+                response["labels"] = labels
+            return response
+        return {"ok": False, "error": f"unknown op {op!r}"}
+
+    async def handle_connection(self, reader, writer):
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    response = await self.handle_request(json.loads(line))
+                except Exception as exc:
+                    response = {"ok": False, "error": f"{type(exc).__name__}: {exc}"}
+                writer.write(json.dumps(response).encode() + b"\n")
+                await writer.drain()
+        finally:
+            writer.close()
+
+    async def serve(self, socket_path=None, host=None, port=None):
+        tasks = [asyncio.create_task(batcher.run()) for batcher in self.batchers.values()]
+
+        if port is not None:
+            server = await asyncio.start_server(self.handle_connection, host or "127.0.0.1", port, limit=2 ** 26)
+            where = f"{host or '127.0.0.1'}:{port}"
+        else:
+            if os.path.exists(socket_path):
+                os.unlink(socket_path)
+            server = await asyncio.start_unix_server(self.handle_connection, socket_path, limit=2 ** 26)
+            where = f"unix:{socket_path}"
+
+        print(f"Inference server listening on {where}", file=sys.stderr)
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            for task in tasks:
+                task.cancel()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve the crop and leaf models with micro-batching.")
+    parser.add_argument("--socket", default=DEFAULT_SOCKET, help="Unix socket path (ignored with --port)")
+    parser.add_argument("--host", default="127.0.0.1", help="TCP host when --port is given")
+    parser.add_argument("--port", type=int, default=None, help="Listen on localhost TCP instead of a Unix socket")
+    parser.add_argument("--max-batch", type=int, default=64, help="Rows per micro-batch")
+    parser.add_argument("--max-wait-ms", type=float, default=5.0, help="Longest wait for a batch to fill")
+    parser.add_argument("--workers", type=int, default=2, help="Inference threads")
+    args = parser.parse_args(argv)
+
+    server = InferenceServer(args.max_batch, args.max_wait_ms / 1000.0, args.workers)
+    try:
+        asyncio.run(server.serve(args.socket, args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,199 @@
+"""Tiled leaf-model inference for high-resolution field and drone images, one heatmap cell per window.
+
+TIFF and .npy rasters are memory-mapped rather than loaded whole; JPEG and PNG are held to the upload limits.
+
+    python -m src.tiles orthomosaic.tif --stride 128 --summary field.json --overlay field.png
+"""
+import argparse
+import json
+import os
+from functools import partial
+
+import numpy as np
+
+from src.images import MAX_BYTES, ImageTooLarge, check_limits
+from src.leaf import BACKENDS, CLASS_NAMES, DEFAULT_BACKEND, IMAGE_SIZE, predict_leaf
+
+
+def open_raster(path):
+    """Return (H x W x C array or memmap, is_rgb) without reading more pixels than needed."""
+    ext = os.path.splitext(path)[1].lower()
+    if ext == ".npy":
+        # Stored in the BGR order the model is fed, like OpenCV arrays
+        return check_layout(np.load(path, mmap_mode="r"), path), False
+    if ext in (".tif", ".tiff"):
+        import tifffile
+        try:
+            raster = tifffile.memmap(path, mode="r")
+        except ValueError:
+            # Compressed: decoded strip by strip into a temporary memory-mapped file
+            raster = tifffile.imread(path, out="memmap")
+        return check_layout(raster, path), True
+
+    with open(path, "rb") as f:
+        data = f.read(MAX_BYTES + 1)
+    try:
+        check_limits(data)
+    except ImageTooLarge as e:
+        raise ValueError(f"{path}: {e}; convert it to TIFF or .npy to tile it without decoding it whole")
+    image = decode_full(data)
+    if image is None:
+        raise ValueError(f"Cannot read image {path}")
+    return image, False
+
+
+def check_layout(raster, path):
+    """Return ``raster`` as H x W x C uint8 (C of 1, 3 or 4), moving a planar C x H x W axis; else raise."""
+    if raster.dtype != np.uint8:
+        raise ValueError(f"{path}: {raster.dtype} pixels, expected 8-bit")
+    if raster.ndim == 2:
+        return raster[..., None]
+    if raster.ndim == 3 and raster.shape[2] in (1, 3, 4):
+        return raster
+    if raster.ndim == 3 and raster.shape[0] in (1, 3, 4):
+        # A view, so a memory map stays a memory map
+        return np.moveaxis(raster, 0, -1)
+    raise ValueError(f"{path}: cannot tile an image of shape {raster.shape}")
+
+
+def _bgr(window, rgb):
+    # Grayscale is repeated into three channels; an alpha channel is dropped
+    window = np.asarray(window)
+    if window.shape[2] == 1:
+        return np.repeat(window, 3, axis=2)
+    window = window[..., :3]
+    return window[..., ::-1] if rgb else window
+
+
+def decode_full(data):
+    """Decode uploaded bytes at full resolution for tiling (BGR), or None if unreadable or over the limits."""
+    import cv2
+    buffer = np.frombuffer(data, dtype=np.uint8)
+    if buffer.size == 0:
+        return None
+    try:
+        check_limits(data)
+    except ImageTooLarge:
+        return None
+    return cv2.imdecode(buffer, cv2.IMREAD_COLOR)
+
+
+def tile_origins(length, tile=IMAGE_SIZE, stride=IMAGE_SIZE):
+    """Window starts along one axis; the last window is aligned to the far edge."""
+    if length <= tile:
+        return [0]
+    starts = list(range(0, length - tile + 1, stride))
+    if starts[-1] + tile < length:
+        starts.append(length - tile)
+    return starts
+
+
+def _read_tile(raster, y, x, tile, rgb, out):
+    window = _bgr(raster[y:y + tile, x:x + tile], rgb)
+    h, w = window.shape[:2]
+    out[:h, :w] = window
+    if h < tile or w < tile:
+        # Images smaller than a window are padded by repeating their edge
+        out[h:, :w] = out[h - 1:h, :w]
+        out[:, w:] = out[:, w - 1:w]
+
+
+def predict_tiles(raster, predict, tile=IMAGE_SIZE, stride=IMAGE_SIZE, batch_size=32, rgb=False):
+    """Class probabilities per window, shape (rows, cols, n_classes), in row-major window order."""
+    height, width = raster.shape[:2]
+    ys, xs = tile_origins(height, tile, stride), tile_origins(width, tile, stride)
+    heatmap = np.empty((len(ys), len(xs), len(CLASS_NAMES)), dtype=np.float32)
+    batch = np.empty((batch_size, tile, tile, 3), dtype=np.uint8)
+
+    cells = [(i, j) for i in range(len(ys)) for j in range(len(xs))]
+    for start in range(0, len(cells), batch_size):
+        chunk = cells[start:start + batch_size]
+        for k, (i, j) in enumerate(chunk):
+            _read_tile(raster, ys[i], xs[j], tile, rgb, batch[k])
+        proba = np.asarray(predict(batch[:len(chunk)]))
+        rows, cols = zip(*chunk)
+        heatmap[list(rows), list(cols)] = proba
+    return heatmap
+
+
+def summarize(heatmap, min_confidence=0.5):
+    """Field-level summary: share of windows per top class and mean probability per class."""
+    proba = heatmap.reshape(-1, heatmap.shape[-1])
+    top = np.argmax(proba, axis=1)
+    confident = proba.max(axis=1) >= min_confidence
+    share = np.bincount(top, minlength=len(CLASS_NAMES)) / len(top)
+    confident_share = np.bincount(top[confident], minlength=len(CLASS_NAMES)) / len(top)
+    return {
+        "windows": int(len(top)),
+        "grid": list(heatmap.shape[:2]),
+        "min_confidence": min_confidence,
+        "classes": [
+            {
+                "class": name,
+                "window_share": float(share[c]),
+                "confident_window_share": float(confident_share[c]),
+                "mean_probability": float(proba[:, c].mean()),
+            }
+            for c, name in enumerate(CLASS_NAMES)
+        ],
+    }
+
+
+def render_heatmap(heatmap, class_index, width=512, background=None, alpha=0.5):
+    """Colour one class's probabilities, optionally blended over a BGR preview of the image."""
+    import cv2
+    rows, cols = heatmap.shape[:2]
+    height = max(1, round(width * rows / cols))
+    values = (np.clip(heatmap[..., class_index], 0, 1) * 255).astype(np.uint8)
+    colored = cv2.applyColorMap(cv2.resize(values, (width, height), interpolation=cv2.INTER_NEAREST),
+                                cv2.COLORMAP_JET)
+    if background is None:
+        return colored
+    base = cv2.resize(np.ascontiguousarray(background), (width, height), interpolation=cv2.INTER_AREA)
+    return cv2.addWeighted(base, 1 - alpha, colored, alpha, 0)
+
+
+def preview(raster, rgb=False, width=512):
+    """Small BGR preview of a raster, sampled with a stride so the full image is never loaded."""
+    height, full_width = raster.shape[:2]
+    step = max(1, full_width // width)
+    return _bgr(raster[::step, ::step], rgb)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Tiled leaf-disease inference over a large image.")
+    parser.add_argument("image", help="TIFF (needs tifffile) or BGR .npy raster of any size, "
+                                      "or a JPEG/PNG within the upload limits")
+    parser.add_argument("--stride", type=int, default=IMAGE_SIZE, help="Window step in pixels (< 256 overlaps)")
+    parser.add_argument("--batch-size", type=int, default=32, help="Windows per model call")
+    parser.add_argument("--backend", default=DEFAULT_BACKEND, choices=BACKENDS, help="Leaf model backend")
+    parser.add_argument("--heatmap", help="Save the (rows, cols, classes) probabilities as .npy")
+    parser.add_argument("--summary", help="Write the field summary JSON here")
+    parser.add_argument("--overlay", help="Write a PNG per class: <overlay stem>_<class>.png")
+    args = parser.parse_args(argv)
+
+    raster, rgb = open_raster(args.image)
+    heatmap = predict_tiles(
+        raster, partial(predict_leaf, backend=args.backend),
+        stride=args.stride, batch_size=args.batch_size, rgb=rgb,
+    )
+    summary = summarize(heatmap)
+    summary["image"] = args.image
+    summary["stride"] = args.stride
+    print(json.dumps(summary, indent=2))
+
+    if args.heatmap:
+        np.save(args.heatmap, heatmap)
+    if args.summary:
+        with open(args.summary, "w") as f:
+            json.dump(summary, f, indent=2)
+    if args.overlay:
+        import cv2
+        stem = os.path.splitext(args.overlay)[0]
+        background = preview(raster, rgb)
+        for c, name in enumerate(CLASS_NAMES):
+            cv2.imwrite(f"{stem}_{name.replace(' ', '_')}.png", render_heatmap(heatmap, c, background=background))
+
+
+if __name__ == "__main__":
+    main()
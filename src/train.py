@@ -1,16 +1,75 @@
 import pandas as pd
-from sklearn.model_selection import train_test_split
+import numpy as np
+import sklearn
+from sklearn.model_selection import ParameterGrid, StratifiedKFold, train_test_split
 from sklearn.preprocessing import LabelEncoder
 from sklearn.ensemble import RandomForestClassifier
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import argparse
+import hashlib
+import io
 import joblib
+import json
 import os
+import sys
+import tempfile
+import time
 
-def train_model():
-    # Load dataset
-    df = pd.read_csv("data/crop_yield.csv")
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.centroid import CENTROIDS_PATH, fit_centroids, oob_labels, parity_report, save_centroids
+from src.forest import FOREST_PATH, compile_forest, save_forest
+from src.preprocess import file_digest, iter_dataset, load_dataset
+from src.schema import FEATURES, MATRIX_DTYPE, format_violations, validate
+
+def _dump_atomic(obj, path, dump=joblib.dump):
+    # Write next to the target and rename so a running app never reads a partial
+    # file, and processes that memory-mapped the old one keep a valid mapping
+    tmp_path = path + ".tmp"
+    dump(obj, tmp_path)
+    os.replace(tmp_path, path)
+
+def _write_json_atomic(obj, path):
+    with open(path + ".tmp", "w") as f:
+        json.dump(obj, f, indent=2)
+    os.replace(path + ".tmp", path)
+
+DATA_PATH = "data/crop_yield.csv"
+MODEL_PATH = "models/crop_yield_model.pkl"
+ENCODER_PATH = "models/label_encoder.pkl"
+MANIFEST_PATH = "models/crop_yield_model.json"
+CHECKPOINT_PATH = "models/train_checkpoint.json"
+RECENT_PATH = "models/train_recent.pkl"
+
+# Rows per crop kept from earlier data to refresh trees alongside new rows
+RECENT_PER_CLASS = 50
+# Bytes before the checkpoint offset hashed to detect edits to old rows
+TAIL_BYTES = 65536
+
+# Hyperparameters of the default train_model() forest
+MODEL_PARAMS = {"n_estimators": 200, "random_state": 42}
+
+# Hyperparameter grid for search_model()
+SEARCH_GRID = {
+    "n_estimators": [50, 100, 200],
+    "max_depth": [None, 12, 20],
+    "min_samples_leaf": [1, 2, 4],
+}
+
+def drop_invalid_rows(df):
+    # Rows outside the physical ranges in src/schema.py never reach the model
+    _, valid, violations = validate(df, errors="mask")
+    if violations:
+        print(f"Dropping {int((~valid).sum())} rows with out-of-range values ({format_violations(violations)})")
+        df = df[valid]
+    return df
+
+def load_training_data(path=DATA_PATH):
+    # Load dataset (float32 features and categorical labels via the column cache)
+    df = drop_invalid_rows(load_dataset(path))
 
     # Features
-    X = df[["N", "P", "K", "temperature", "humidity", "ph", "rainfall"]]
+    X = df[FEATURES]
 
     # Target label (vegetable type)
     y = df["label"]
@@ -19,23 +78,404 @@ def train_model():
     encoder = LabelEncoder()
     y_encoded = encoder.fit_transform(y)
 
-    # Train/test split
-    X_train, X_test, y_train, y_test = train_test_split(
-        X, y_encoded, test_size=0.2, random_state=42
-    )
+    return X, y_encoded, encoder
 
-    # Model
-    model = RandomForestClassifier(n_estimators=200, random_state=42)
-    model.fit(X_train, y_train)
+def split_data(X, y):
+    # Train/test split
+    return train_test_split(X, y, test_size=0.2, random_state=42)
 
+def save_artifacts(model, encoder, centroids=None, **manifest):
     # Create models folder if missing
     os.makedirs("models", exist_ok=True)
 
     # Save model & encoder
-    joblib.dump(model, "models/crop_yield_model.pkl")
-    joblib.dump(encoder, "models/label_encoder.pkl")
+    _dump_atomic(model, MODEL_PATH)
+    _dump_atomic(encoder, ENCODER_PATH)
+
+    # Flat-array export of the same trees, written uncompressed so predict.py
+    # can memory-map it instead of unpickling the forest
+    _dump_atomic(compile_forest(model), FOREST_PATH, dump=save_forest)
+
+    # Nearest-centroid fast path calibrated against these trees; without one
+    # an older file would no longer match the forest, so it is removed
+    artifacts = [MODEL_PATH, ENCODER_PATH, FOREST_PATH]
+    if centroids is not None:
+        _dump_atomic(centroids, CENTROIDS_PATH, dump=save_centroids)
+        artifacts.append(CENTROIDS_PATH)
+    elif os.path.exists(CENTROIDS_PATH):
+        os.remove(CENTROIDS_PATH)
+
+    # Record what produced the artifacts (keyword arguments add data hash,
+    # metrics, timing and the cache fingerprint when the caller has them)
+    manifest.setdefault("fingerprint", None)
+    manifest.update({
+        "features": FEATURES,
+        "classes": [str(c) for c in encoder.classes_],
+        "params": model.get_params(),
+        "sklearn_version": sklearn.__version__,
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "artifacts": {path: file_digest(path) for path in artifacts},
+    })
+    _write_json_atomic(manifest, MANIFEST_PATH)
+    return manifest
+
+def load_manifest(path=MANIFEST_PATH):
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+def training_fingerprint(data_sha1, params):
+    # Everything that decides the fitted model; equal fingerprints mean equal artifacts
+    payload = {
+        "data_sha1": data_sha1,
+        "features": FEATURES,
+        "params": params,
+        "split": {"test_size": 0.2, "random_state": 42},
+        "sklearn_version": sklearn.__version__,
+        "outputs": [MODEL_PATH, ENCODER_PATH, FOREST_PATH, CENTROIDS_PATH],
+    }
+    return hashlib.sha1(json.dumps(payload, sort_keys=True).encode()).hexdigest()
+
+def _cached_manifest(fingerprint):
+    manifest = load_manifest()
+    if manifest is None or manifest.get("fingerprint") != fingerprint:
+        return None
+    # The artifacts on disk must still be the ones the manifest describes
+    for path, digest in manifest.get("artifacts", {}).items():
+        if not os.path.exists(path) or file_digest(path) != digest:
+            return None
+    return manifest
+
+def _tail_digest(path, offset):
+    with open(path, "rb") as f:
+        f.seek(max(0, offset - TAIL_BYTES))
+        tail = f.read(offset - max(0, offset - TAIL_BYTES))
+    return hashlib.sha1(tail).hexdigest(), tail.endswith(b"\n") or offset == 0
+
+def write_checkpoint(df, rows, path=DATA_PATH):
+    # Where the trained-on data ends, so the next run reads only what follows,
+    # plus the latest rows of each crop for the next incremental fit. The
+    # model digest ties it to the model it describes.
+    offset = os.path.getsize(path)
+    digest, _ = _tail_digest(path, offset)
+    checkpoint = {"data_path": path, "byte_offset": offset, "rows": rows, "tail_sha1": digest,
+                  "model_sha1": file_digest(MODEL_PATH)}
+    _dump_atomic(df.groupby("label").tail(RECENT_PER_CLASS), RECENT_PATH)
+    _write_json_atomic(checkpoint, CHECKPOINT_PATH)
+
+def train_model(force=False):
+    """Fit the default forest, or return the manifest of an identical earlier run.
+
+    The fingerprint covers the data hash, features, hyperparameters, split
+    and sklearn version; when it matches the saved manifest and the
+    artifacts are untouched nothing is refitted unless force is set.
+    """
+    data_sha1 = file_digest(DATA_PATH)
+    fingerprint = training_fingerprint(data_sha1, MODEL_PARAMS)
+    if not force:
+        manifest = _cached_manifest(fingerprint)
+        if manifest is not None:
+            print("Inputs unchanged since the last training, keeping the saved model.")
+            return manifest
+
+    start = time.perf_counter()
+    X, y_encoded, encoder = load_training_data()
+    X_train, X_test, y_train, y_test = split_data(X, y_encoded)
+
+    # Model
+    model = RandomForestClassifier(**MODEL_PARAMS)
+    model.fit(X_train, y_train)
+    centroids = fit_centroids(X_train, y_train, oob_labels(model, X_train))
+    training_time = time.perf_counter() - start
+
+    holdout = float(np.mean(model.predict(X_test) == y_test))
+    print(f"Held-out accuracy: {holdout:.4f} (python -m src.evaluate for per-crop metrics)")
+    cascade = parity_report(centroids, compile_forest(model), X_test, y_test)
+    print(f"Fast path answers {cascade['fast_path_rate']:.1%} of held-out rows, "
+          f"agreeing with the forest on {cascade['agreement']:.2%}.")
+    manifest = save_artifacts(
+        model, encoder,
+        centroids=centroids,
+        fingerprint=fingerprint,
+        data_path=DATA_PATH,
+        data_sha1=data_sha1,
+        rows=len(X),
+        metrics={"holdout_accuracy": holdout, "cascade": cascade},
+        training_time_s=training_time,
+    )
+    write_checkpoint(X.assign(label=encoder.inverse_transform(y_encoded)), len(X))
 
     print("Model and encoder saved successfully.")
+    return manifest
+
+def make_folds(y, n_splits=5):
+    # Stratified fold indices, computed once and shared by every candidate
+    splitter = StratifiedKFold(n_splits=n_splits, shuffle=True, random_state=42)
+    return [(train_idx, test_idx) for train_idx, test_idx in splitter.split(np.zeros(len(y)), y)]
+
+# Per-worker state set by init_worker
+worker_data = {}
+
+def init_worker(X_path, y, folds):
+    # The feature matrix is memory-mapped read-only, so workers share one copy
+    worker_data["X"] = np.load(X_path, mmap_mode="r")
+    worker_data["y"] = y
+    worker_data["folds"] = folds
+
+def _score_candidate(params):
+    X, y, folds = worker_data["X"], worker_data["y"], worker_data["folds"]
+    start = time.perf_counter()
+    scores = []
+    for train_idx, test_idx in folds:
+        model = RandomForestClassifier(random_state=42, n_jobs=1, **params)
+        model.fit(X[train_idx], y[train_idx])
+        scores.append(np.mean(model.predict(X[test_idx]) == y[test_idx]))
+    return params, float(np.mean(scores)), float(np.std(scores)), time.perf_counter() - start
+
+def search_model(param_grid=SEARCH_GRID, n_splits=5, n_jobs=None):
+    X, y_encoded, encoder = load_training_data()
+    X_train, X_test, y_train, y_test = split_data(X, y_encoded)
+
+    # float32 is what the trees use internally, so nothing is lost
+    X_values = np.ascontiguousarray(X_train.to_numpy(dtype=MATRIX_DTYPE))
+    folds = make_folds(y_train, n_splits)
+    candidates = list(ParameterGrid(param_grid))
+    n_jobs = n_jobs or os.cpu_count()
+
+    results = []
+    start = time.perf_counter()
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        X_path = os.path.join(tmp_dir, "X_train.npy")
+        np.save(X_path, X_values)
+        with ProcessPoolExecutor(
+            max_workers=n_jobs,
+            initializer=init_worker,
+            initargs=(X_path, y_train, folds),
+        ) as pool:
+            futures = [pool.submit(_score_candidate, params) for params in candidates]
+            for future in as_completed(futures):
+                params, mean, std, wall = future.result()
+                results.append((params, mean, std, wall))
+                print(f"{mean:.4f} +/- {std:.4f}  {wall:6.2f}s  {params}")
+
+    results.sort(key=lambda r: (-r[1], r[3]))
+    best_params, best_score = results[0][0], results[0][1]
+    print(f"Searched {len(candidates)} candidates x {n_splits} folds on {n_jobs} processes "
+          f"in {time.perf_counter() - start:.1f}s")
+    print(f"Best CV accuracy {best_score:.4f} with {best_params}")
+
+    # Refit the winner on the full training split
+    refit_start = time.perf_counter()
+    model = RandomForestClassifier(random_state=42, n_jobs=-1, **best_params)
+    model.fit(X_train, y_train)
+    refit_time = time.perf_counter() - refit_start
+    holdout = float(np.mean(model.predict(X_test) == y_test))
+    print(f"Held-out accuracy: {holdout:.4f}")
+
+    model.n_jobs = None
+    centroids = fit_centroids(X_train, y_train, oob_labels(model, X_train))
+    cascade = parity_report(centroids, compile_forest(model), X_test, y_test)
+    save_artifacts(
+        model, encoder,
+        centroids=centroids,
+        data_path=DATA_PATH,
+        data_sha1=file_digest(DATA_PATH),
+        rows=len(X),
+        metrics={"cv_accuracy": best_score, "holdout_accuracy": holdout, "cascade": cascade},
+        training_time_s=refit_time,
+    )
+    write_checkpoint(X.assign(label=encoder.inverse_transform(y_encoded)), len(X))
+    print("Model and encoder saved successfully.")
+    return best_params, results
+
+class Reservoir:
+    """Uniform fixed-size sample of a stream of rows (Algorithm R, vectorized per chunk)."""
+
+    def __init__(self, size, n_features, seed=42):
+        self.size = size
+        self.seen = 0
+        self.X = np.empty((size, n_features), dtype=MATRIX_DTYPE)
+        self.y = np.empty(size, dtype=object)
+        self.rng = np.random.default_rng(seed)
+
+    def add(self, X, y):
+        # Fill the empty slots first
+        fill = min(max(self.size - self.seen, 0), len(X))
+        if fill:
+            self.X[self.seen:self.seen + fill] = X[:fill]
+            self.y[self.seen:self.seen + fill] = y[:fill]
+
+        # Row i of the stream replaces a random slot with probability size / (i + 1)
+        rest = np.arange(fill, len(X))
+        if len(rest):
+            slots = self.rng.integers(0, self.seen + rest + 1)
+            keep = slots < self.size
+            slots, rows = slots[keep], rest[keep]
+            # When two rows pick the same slot the later one wins, as in the sequential algorithm
+            last = len(slots) - 1 - np.unique(slots[::-1], return_index=True)[1]
+            self.X[slots[last]] = X[rows[last]]
+            self.y[slots[last]] = y[rows[last]]
+        self.seen += len(X)
+
+    def sample(self):
+        n = min(self.seen, self.size)
+        return self.X[:n], self.y[:n]
+
+def train_model_streaming(path=DATA_PATH, chunksize=100000, sample_size=200000):
+    """Train from a CSV too large for memory.
+
+    The file is read chunk by chunk, with only the feature and label
+    columns parsed. A reservoir keeps a uniform sample of at most
+    sample_size rows, so peak memory depends on chunksize and
+    sample_size, not on the file size. The forest is fitted on that
+    sample, and the encoder on every label seen in the file.
+    """
+    reservoir = Reservoir(sample_size, len(FEATURES))
+    labels = set()
+    start = time.perf_counter()
+    for chunk in iter_dataset(path, chunksize=chunksize, columns=FEATURES + ["label"]):
+        chunk = drop_invalid_rows(chunk)
+        y_chunk = chunk["label"].astype(object).to_numpy()
+        labels.update(chunk["label"].cat.categories)
+        reservoir.add(chunk[FEATURES].to_numpy(dtype=MATRIX_DTYPE), y_chunk)
+    X_sample, y_sample = reservoir.sample()
+    print(f"Streamed {reservoir.seen:,} rows in {time.perf_counter() - start:.1f}s, "
+          f"training on a sample of {len(X_sample):,}")
+
+    encoder = LabelEncoder()
+    encoder.fit(sorted(labels))
+    fit_start = time.perf_counter()
+    X_frame = pd.DataFrame(X_sample, columns=FEATURES)
+    y_codes = encoder.transform(y_sample)
+    model = RandomForestClassifier(n_jobs=-1, **MODEL_PARAMS)
+    model.fit(X_frame, y_codes)
+    model.n_jobs = None
+
+    save_artifacts(
+        model, encoder,
+        centroids=fit_centroids(X_sample, y_codes, oob_labels(model, X_sample)),
+        data_path=path,
+        rows=reservoir.seen,
+        sample_rows=len(X_sample),
+        training_time_s=time.perf_counter() - fit_start,
+    )
+    if path == DATA_PATH:
+        write_checkpoint(X_frame.assign(label=y_sample), reservoir.seen)
+    print("Model and encoder saved successfully.")
+    return model, encoder
+
+def read_appended_rows(path=DATA_PATH):
+    """Return (checkpoint, rows appended since it), or (None, None) if a full refit is needed."""
+    if not os.path.exists(CHECKPOINT_PATH) or not os.path.exists(RECENT_PATH):
+        return None, None
+    with open(CHECKPOINT_PATH) as f:
+        checkpoint = json.load(f)
+
+    # A model saved since (by --stream on another file or compact --deploy) is not this checkpoint's
+    manifest = load_manifest() or {}
+    if checkpoint.get("model_sha1") != manifest.get("artifacts", {}).get(MODEL_PATH):
+        return None, None
+
+    offset = checkpoint["byte_offset"]
+    if checkpoint["data_path"] != path or os.path.getsize(path) < offset:
+        return None, None
+    digest, ends_with_newline = _tail_digest(path, offset)
+    if digest != checkpoint["tail_sha1"] or not ends_with_newline:
+        # Earlier rows were edited, or the last old line is being continued
+        return None, None
+
+    with open(path, "rb") as f:
+        columns = f.readline().decode().strip().split(",")
+        f.seek(offset)
+        appended = f.read()
+    new_rows = pd.read_csv(io.BytesIO(appended), header=None, names=columns) if appended.strip() else None
+    return checkpoint, new_rows
+
+def _extend_encoder(encoder, labels):
+    # Append unseen crops so existing crops keep their codes
+    new_labels = sorted(set(labels) - set(encoder.classes_))
+    if new_labels:
+        encoder.classes_ = np.concatenate([encoder.classes_, np.array(new_labels, dtype=object)])
+    return new_labels
+
+def train_incremental(new_trees=20):
+    """Grow the saved forest with trees fitted on appended and recent rows.
+
+    Only the bytes after the checkpoint are parsed. The new trees are
+    fitted on the appended rows plus the last RECENT_PER_CLASS rows of
+    every crop, so each crop the forest knows is present. A new crop
+    label is appended to the encoder, so existing codes stay the same,
+    but it needs a full refit because older trees have no output for it.
+    """
+    checkpoint, new_rows = read_appended_rows()
+    if checkpoint is None:
+        print("No usable checkpoint, running a full training.")
+        train_model(force=True)
+        return
+
+    if new_rows is None:
+        print("No new rows since the last training.")
+        return
+
+    new_rows = drop_invalid_rows(new_rows)
+    model = joblib.load(MODEL_PATH)
+    encoder = joblib.load(ENCODER_PATH)
+    recent = joblib.load(RECENT_PATH)
+    new_labels = _extend_encoder(encoder, new_rows["label"])
+
+    start = time.perf_counter()
+    if new_labels:
+        print(f"New crop labels {new_labels}, refitting all trees with a stable encoder.")
+        df = drop_invalid_rows(pd.read_csv(DATA_PATH))
+        # Same hyperparameters as the deployed forest (e.g. from --search or a compact variant)
+        model = RandomForestClassifier(**dict(model.get_params(), warm_start=False))
+        model.fit(df[FEATURES], encoder.transform(df["label"]))
+        recent = df
+        fitted = range(model.n_estimators)
+    else:
+        recent = pd.concat([recent, new_rows[recent.columns]], ignore_index=True)
+        old_trees = model.n_estimators
+        model.set_params(warm_start=True, n_estimators=old_trees + new_trees)
+        model.fit(recent[FEATURES], encoder.transform(recent["label"]))
+        model.set_params(warm_start=False)
+        # Only the new trees' samples of these rows are known
+        fitted = range(old_trees, model.n_estimators)
+
+    # The fast path is refitted on the same rows, so it keeps matching the forest
+    y_recent = encoder.transform(recent["label"])
+    centroids = fit_centroids(recent[FEATURES], y_recent, oob_labels(model, recent[FEATURES], fitted))
+
+    save_artifacts(
+        model, encoder,
+        centroids=centroids,
+        data_path=DATA_PATH,
+        data_sha1=file_digest(DATA_PATH),
+        rows=checkpoint["rows"] + len(new_rows),
+        incremental_rows=len(new_rows),
+        training_time_s=time.perf_counter() - start,
+    )
+    write_checkpoint(recent, checkpoint["rows"] + len(new_rows))
+    print(f"Added {len(new_rows)} rows; forest now has {model.n_estimators} trees.")
 
 if __name__ == "__main__":
-    train_model()
+    parser = argparse.ArgumentParser(description="Train the crop recommendation model.")
+    parser.add_argument("--force", action="store_true", help="Refit even if data and parameters are unchanged")
+    parser.add_argument("--search", action="store_true", help="Run a cross-validated hyperparameter search first")
+    parser.add_argument("--folds", type=int, default=5, help="CV folds for --search")
+    parser.add_argument("--jobs", type=int, default=None, help="Worker processes for --search (default: all cores)")
+    parser.add_argument("--incremental", action="store_true", help="Add trees for rows appended since the last run")
+    parser.add_argument("--new-trees", type=int, default=20, help="Trees added by --incremental")
+    parser.add_argument("--stream", metavar="CSV", help="Train out-of-core from this CSV via a reservoir sample")
+    parser.add_argument("--chunksize", type=int, default=100000, help="Rows per chunk for --stream")
+    parser.add_argument("--sample-size", type=int, default=200000, help="Reservoir size for --stream")
+    args = parser.parse_args()
+
+    if args.stream:
+        train_model_streaming(args.stream, args.chunksize, args.sample_size)
+    elif args.incremental:
+        train_incremental(new_trees=args.new_trees)
+    elif args.search:
+        search_model(n_splits=args.folds, n_jobs=args.jobs)
+    else:
+        train_model(force=args.force)
@@ -1,16 +1,14 @@
 import streamlit as st
-import pandas as pd
 from io import BytesIO
-from fpdf import FPDF
 import sys
 import os
-import matplotlib
-matplotlib.use("Agg")  # for headless environments (Streamlit)
-import matplotlib.pyplot as plt
 import tempfile
 
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
 
+from src.preprocess import load_dataset
+from src.schema import validate
+
 # Page Config
 st.set_page_config(
     page_title="Crop Growing Guide",
@@ -22,7 +20,10 @@ st.set_page_config(
 # Load dataset
 @st.cache_data
 def load_data():
-    return pd.read_csv("data/crop_yield.csv")
+    df = load_dataset("data/crop_yield.csv")
+    # Keep implausible rows out of the per-crop averages
+    _, valid, _ = validate(df, errors="mask")
+    return df[valid]
 
 df = load_data()
 
@@ -53,8 +54,17 @@ st.markdown("""
 #  IMAGE / DIAGRAM HELPERS  (Magazine-style diagrams)
 # ============================================================
 
+def _pyplot():
+    """Import pyplot on first use so the page renders without loading matplotlib."""
+    import matplotlib
+    matplotlib.use("Agg")  # for headless environments (Streamlit)
+    import matplotlib.pyplot as plt
+    return plt
+
+
 def _save_fig_temp(fig):
     """Save a Matplotlib figure to a temporary PNG file and return its path."""
+    plt = _pyplot()
     tmp = tempfile.NamedTemporaryFile(delete=False, suffix=".png")
     fig.savefig(tmp.name, format="png", dpi=220, bbox_inches="tight")
     plt.close(fig)
@@ -63,6 +73,7 @@ def _save_fig_temp(fig):
 
 def create_planting_season_diagram(crop_name, ideal_temp, ideal_rainfall):
     """Diagram for 'Best Planting Season' – shows suitability per season."""
+    plt = _pyplot()
     seasons = ["Winter", "Spring", "Summer", "Autumn"]
     # simple heuristic using temperature / rainfall
     scores = []
@@ -92,6 +103,7 @@ def create_planting_season_diagram(crop_name, ideal_temp, ideal_rainfall):
 
 def create_soil_profile_diagram(ideal_ph, N, P, K):
     """Diagram for 'Soil Preparation & Fertilization' – soil profile style."""
+    plt = _pyplot()
     fig, ax = plt.subplots(figsize=(5, 3))
     layers = ["Surface Organic Layer", "Topsoil (NPK)", "Subsoil", "Parent Material"]
     importance = [7, 9, 5, 3]
@@ -112,6 +124,7 @@ def create_soil_profile_diagram(ideal_ph, N, P, K):
 
 def create_irrigation_schedule_diagram():
     """Diagram for 'Irrigation Schedule' – water demand per stage."""
+    plt = _pyplot()
     stages = ["Sowing", "Early Growth", "Flowering", "Grain Filling", "Maturity"]
     water_need = [7, 8, 10, 8, 5]
 
@@ -130,6 +143,7 @@ def create_irrigation_schedule_diagram():
 
 def create_pests_treatment_diagram():
     """Diagram for 'Pests & Recommended Treatments' – IPM strategy mix."""
+    plt = _pyplot()
     strategies = ["Monitoring", "Cultural\nPractices", "Biological\nControl", "Chemical\nControl"]
     weight = [9, 7, 6, 4]
 
@@ -149,6 +163,7 @@ def create_pests_treatment_diagram():
 
 def create_growth_stages_diagram():
     """Diagram for 'Growth Stages & Care Guide' – attention level across timeline."""
+    plt = _pyplot()
     stages = ["Emergence", "Tillering\n/Leafing", "Stem\nElongation", "Flowering", "Ripening"]
     attention = [9, 8, 8, 10, 6]
 
@@ -180,6 +195,8 @@ def generate_crop_pdf(crop_name, ideal, ranges, recommendation_text):
     crop_name = crop_name.replace("–", "-")
     recommendation_text = recommendation_text.replace("–", "-")
 
+    from fpdf import FPDF
+
     pdf = FPDF()
     pdf.set_auto_page_break(auto=True, margin=15)
     pdf.add_page()
@@ -2,7 +2,8 @@ import streamlit as st
 import sys, os
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
 
-from src.predict import predict_crop
+from src.predict import predict_top_k_cached
+from src.schema import RANGES, SchemaError
 from components.styles import create_feature_card
 
 # Page Config
@@ -104,7 +105,13 @@ if submit:
             "rainfall": rainfall
         }
 
-        result = predict_crop(features)
+        try:
+            ranked = predict_top_k_cached(features, k=3)
+        except SchemaError as e:
+            limits = ", ".join(f"{name} {lo:g}–{hi:g}" for name, (lo, hi) in RANGES.items())
+            st.error(f"Input outside the supported ranges: {e}. Supported: {limits}.")
+            st.stop()
+        result, confidence = ranked[0]
 
         st.markdown("---")
         st.markdown(
@@ -119,9 +126,16 @@ if submit:
             <div class="results-card">
                 <h4 style="margin:0;">Recommended Crop</h4>
                 <h2 style="margin:10px 0; font-size:2rem;"> {result}</h2>
+                <p style="margin:0;">Confidence: {confidence:.0%}</p>
             </div>
             """, unsafe_allow_html=True)
 
+            if len(ranked) > 1:
+                st.markdown('<div class="subsection-header"><i class="fa-solid fa-list-ol"></i> Alternatives</div>',
+                            unsafe_allow_html=True)
+                for alt_crop, alt_prob in ranked[1:]:
+                    st.write(f"- **{alt_crop}** ({alt_prob:.0%})")
+
         with colB:
             st.markdown('<div class="summary-box">', unsafe_allow_html=True)
             st.write(f"""
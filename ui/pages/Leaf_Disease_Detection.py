@@ -1,25 +1,16 @@
 import streamlit as st
 import numpy as np
-import cv2
-from keras.models import load_model
-import os
+import sys, os, time
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
 
-# ==============================================================
-# Load Model
-# ==============================================================
-MODEL_PATH = os.path.join("models", "plant_disease_model.h5")
-
-@st.cache_resource
-def load_disease_model():
-    return load_model(MODEL_PATH)
+from src.client import get_client
+from src.leaf import CLASS_NAMES, DEFAULT_BACKEND, available_backends, diagnose, diagnosis_cache, predict_leaf
+from src.images import ImageTooLarge, check_limits, encode_jpeg, thumbnails
+from src.tiles import decode_full, predict_tiles, render_heatmap, summarize
 
-model = load_disease_model()
-
-CLASS_NAMES = (
-    'Tomato-Bacterial_spot',
-    'Potato-Barly blight',
-    'Corn-Common_rust'
-)
+# With AGRI_INFERENCE_ADDR set the shared inference server holds the model;
+# otherwise keras/cv2 are only imported once an image is analyzed
+client = get_client()
 
 # ==============================================================
 # UI Styling
@@ -58,47 +49,105 @@ href="https://cdnjs.cloudflare.com/ajax/libs/font-awesome/6.5.0/css/all.min.css"
 st.markdown('<div class="title"><i class="fa-solid fa-leaf"></i> Leaf Disease Detection</div>',
             unsafe_allow_html=True)
 
-st.write(" Upload a leaf image & get instant disease diagnosis")
+st.write(" Upload one or more leaf images & get instant disease diagnosis")
 
 col1, col2 = st.columns([1.2, 1])
 
 with col1:
     st.markdown('<div class="upload-box">', unsafe_allow_html=True)
-    plant_image = st.file_uploader("Upload Leaf Image", type=["jpg", "jpeg", "png"])
-    submit = st.button("Analyze Image")
+    plant_images = st.file_uploader("Upload Leaf Images", type=["jpg", "jpeg", "png"], accept_multiple_files=True)
+    if client is None:
+        # TFLite exports from src/convert_leaf.py show up here once written
+        backends = available_backends() or [DEFAULT_BACKEND]
+        backend = st.radio(
+            "Inference backend", backends, horizontal=True,
+            index=backends.index(DEFAULT_BACKEND) if DEFAULT_BACKEND in backends else 0,
+        )
+    # Full-resolution 256x256 windows instead of squashing the whole photo
+    tiled = st.checkbox("Tiled analysis for high-resolution field photos")
+    if tiled:
+        overlap = st.select_slider("Window overlap", options=["none", "25%", "50%"], value="none")
+        stride = {"none": 256, "25%": 192, "50%": 128}[overlap]
+    submit = st.button("Analyze Images")
     st.markdown('</div>', unsafe_allow_html=True)
 
 # ==============================================================
 # Prediction
 # ==============================================================
 if submit:
-    if plant_image is None:
-        st.error("Please upload an image first.")
+    if not plant_images:
+        st.error("Please upload at least one image first.")
     else:
-        # Convert → OpenCV
-        data = np.asarray(bytearray(plant_image.read()), dtype=np.uint8)
-        image = cv2.imdecode(data, 1)
-        resized = cv2.resize(image, (256, 256)).reshape((1, 256, 256, 3))
-
-        # Show uploaded image
-        st.image(image, channels="BGR", caption="Uploaded Leaf", use_column_width=True)
-
-        # Prediction
-        prediction = model.predict(resized)
-        result_name = CLASS_NAMES[np.argmax(prediction)]
-        crop, disease = result_name.split("-")
+        start = time.perf_counter()
+        before = diagnosis_cache.stats()
+
+        # Upload buffers are wrapped rather than copied, and files over the
+        # size/pixel limits are turned away from their header alone
+        blobs = [f.getbuffer() for f in plant_images]
+        rejected = {}
+        for i, blob in enumerate(blobs):
+            try:
+                check_limits(blob)
+            except ImageTooLarge as e:
+                rejected[i] = str(e)
+        accepted = [i for i in range(len(blobs)) if i not in rejected]
+
+        # Repeat uploads come from the diagnosis cache; the rest are decoded
+        # and resized concurrently and run through the model as one batch
+        predictions = [None] * len(blobs)
+        with st.spinner("Analyzing images..."):
+            if client is not None:
+                # Only the server knows when its model changes, so no local cache
+                results = diagnose([blobs[i] for i in accepted], predict=client.leaf_proba, cache=None)
+            else:
+                results = diagnose([blobs[i] for i in accepted], backend)
+        for i, proba in zip(accepted, results):
+            predictions[i] = proba
+        elapsed = time.perf_counter() - start
+        after = diagnosis_cache.stats()
+        cached = (after["hits"] + after["disk_hits"]) - (before["hits"] + before["disk_hits"])
+
+        rows = []
+        diseased = []
+        for i, (upload, proba) in enumerate(zip(plant_images, predictions)):
+            if proba is None:
+                problem = f"too large: {rejected[i]}" if i in rejected else "unreadable image"
+                rows.append({"Image": upload.name, "Plant": "-", "Disease": problem, "Confidence": None})
+                continue
+            crop, disease = CLASS_NAMES[np.argmax(proba)].split("-")
+            rows.append({"Image": upload.name, "Plant": crop, "Disease": disease, "Confidence": float(np.max(proba))})
+            if "healthy" not in disease.lower():
+                diseased.append(upload.name)
 
         # Result display
         st.markdown('<div class="result-box">', unsafe_allow_html=True)
-        st.subheader(" Diagnosis Result")
-
-        st.write(f"** Plant Type:** `{crop}`")
-        st.write(f"** Detected Disease:** `{disease}`")
-
-        if "healthy" in disease.lower():
-            st.success(" Great news! The plant is **HEALTHY** and thriving 🌱")
+        st.subheader(" Diagnosis Results")
+
+        m1, m2, m3, m4 = st.columns(4)
+        m1.metric("Images", len(plant_images))
+        m2.metric("Total time", f"{elapsed:.2f} s")
+        m3.metric("Per image", f"{elapsed / len(plant_images) * 1000:.0f} ms")
+        m4.metric("From cache", cached, help=f"Cache hit rate since the app started: {after['hit_rate']:.0%}")
+
+        st.dataframe(
+            rows,
+            column_config={"Confidence": st.column_config.ProgressColumn(format="%.2f", min_value=0, max_value=1)},
+            use_container_width=True,
+        )
+
+        # Small JPEG previews (decoded at 1/8 scale where possible) instead of
+        # sending every full-resolution photo back to the browser
+        readable = [(blob, upload.name) for upload, blob, proba in zip(plant_images, blobs, predictions)
+                    if proba is not None]
+        if readable:
+            st.image(thumbnails([blob for blob, _ in readable]), caption=[name for _, name in readable], width=160)
+
+        if not readable:
+            st.warning(" None of the images could be diagnosed; see the table above.")
+        elif not diseased:
+            st.success(" Great news! Every plant is **HEALTHY** and thriving 🌱")
         else:
-            st.error(f" Disease Detected: **{disease}**")
+            st.error(f" Disease detected in {len(diseased)} of {len(plant_images)} images")
             st.info("""
 ### Recommended Actions
 - Remove and destroy affected leaves  
@@ -107,3 +156,27 @@ if submit:
 - Apply proper fungicides / treatments  
 """)
         st.markdown('</div>', unsafe_allow_html=True)
+
+        if tiled:
+            st.subheader(" Tiled Field Analysis")
+            predict = client.leaf_proba if client is not None else (lambda batch: predict_leaf(batch, backend))
+            for upload, blob in zip(plant_images, blobs):
+                image = decode_full(blob)
+                if image is None:
+                    continue
+                tile_start = time.perf_counter()
+                heatmap = predict_tiles(image, predict, stride=stride)
+                summary = summarize(heatmap)
+                tile_time = time.perf_counter() - tile_start
+
+                st.markdown(f"**{upload.name}** — {summary['windows']} windows "
+                            f"({summary['grid'][0]} x {summary['grid'][1]}) in {tile_time:.2f} s")
+                st.dataframe(
+                    [{"Class": c["class"], "Share of windows": c["window_share"],
+                      "Confident share": c["confident_window_share"], "Mean probability": c["mean_probability"]}
+                     for c in summary["classes"]],
+                    use_container_width=True,
+                )
+                dominant = int(np.argmax([c["window_share"] for c in summary["classes"]]))
+                st.image(encode_jpeg(render_heatmap(heatmap, dominant, background=image)),
+                         caption=f"Heatmap: {CLASS_NAMES[dominant]}", width=512)